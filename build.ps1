@@ -29,6 +29,7 @@ python -m PyInstaller `
     --hidden-import PIL `
     --hidden-import PIL.Image `
     --hidden-import pypresence `
+    --hidden-import orjson `
     --hidden-import winrt `
     --hidden-import winrt.windows.media.control `
     --hidden-import winrt.windows.storage.streams `
@@ -11,106 +11,233 @@ This module fills that gap using raw Windows named-pipe I/O.
 
 import ctypes
 import ctypes.wintypes
+import itertools
 import json
-import os
 import struct
 import threading
 import time
 from typing import Callable, Optional
 
 from logger import get_logger
+from utils import bind_winapi
+
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
 
 log = get_logger("erp.discord_events")
 
+if _orjson is not None:
+    _dumps = _orjson.dumps
+    _loads = _orjson.loads
+    _JSONError = _orjson.JSONDecodeError
+else:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+
+    def _loads(data: bytes):
+        return json.loads(data.decode("utf-8"))
+
+    _JSONError = (json.JSONDecodeError, UnicodeDecodeError)
+
 _GENERIC_RW = 0xC0000000
 _OPEN_EXISTING = 3
-
-_kernel32 = ctypes.windll.kernel32
-_CreateFileW = _kernel32.CreateFileW
-_CreateFileW.restype = ctypes.wintypes.HANDLE
-_ReadFile = _kernel32.ReadFile
-_WriteFile = _kernel32.WriteFile
-_CloseHandle = _kernel32.CloseHandle
-_PeekNamedPipe = _kernel32.PeekNamedPipe
+_FILE_FLAG_OVERLAPPED = 0x40000000
+_ERROR_IO_PENDING = 997
+_WAIT_OBJECT_0 = 0
 
 _INVALID_HANDLE = ctypes.wintypes.HANDLE(-1).value
 
 
+class _OVERLAPPED(ctypes.Structure):
+    _fields_ = [
+        ("Internal", ctypes.c_size_t),
+        ("InternalHigh", ctypes.c_size_t),
+        ("Offset", ctypes.wintypes.DWORD),
+        ("OffsetHigh", ctypes.wintypes.DWORD),
+        ("hEvent", ctypes.wintypes.HANDLE),
+    ]
+
+
+_HANDLE = ctypes.wintypes.HANDLE
+_DWORD = ctypes.wintypes.DWORD
+_BOOL = ctypes.wintypes.BOOL
+_LPDWORD = ctypes.POINTER(_DWORD)
+_LPOVERLAPPED = ctypes.POINTER(_OVERLAPPED)
+
+_kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+_CreateFileW = bind_winapi(
+    _kernel32, "CreateFileW", _HANDLE,
+    ctypes.wintypes.LPCWSTR, _DWORD, _DWORD, ctypes.c_void_p, _DWORD, _DWORD, _HANDLE,
+)
+_ReadFile = bind_winapi(
+    _kernel32, "ReadFile", _BOOL,
+    _HANDLE, ctypes.c_void_p, _DWORD, _LPDWORD, _LPOVERLAPPED,
+)
+_WriteFile = bind_winapi(
+    _kernel32, "WriteFile", _BOOL,
+    _HANDLE, ctypes.c_void_p, _DWORD, _LPDWORD, _LPOVERLAPPED,
+)
+_CloseHandle = bind_winapi(_kernel32, "CloseHandle", _BOOL, _HANDLE)
+_CreateEventW = bind_winapi(
+    _kernel32, "CreateEventW", _HANDLE,
+    ctypes.c_void_p, _BOOL, _BOOL, ctypes.wintypes.LPCWSTR,
+)
+_WaitForSingleObject = bind_winapi(_kernel32, "WaitForSingleObject", _DWORD, _HANDLE, _DWORD)
+_CancelIoEx = bind_winapi(_kernel32, "CancelIoEx", _BOOL, _HANDLE, _LPOVERLAPPED)
+_GetOverlappedResult = bind_winapi(
+    _kernel32, "GetOverlappedResult", _BOOL,
+    _HANDLE, _LPOVERLAPPED, _LPDWORD, _BOOL,
+)
+
+_HDR = struct.Struct("<II")
+
+# SUBSCRIBE frames never change shape; only the nonce is filled in.
+_SUB_JOIN = b'{"cmd":"SUBSCRIBE","evt":"ACTIVITY_JOIN","nonce":"%b"}'
+_SUB_JOIN_REQUEST = b'{"cmd":"SUBSCRIBE","evt":"ACTIVITY_JOIN_REQUEST","nonce":"%b"}'
+
+# Nonces only need to be unique per connection, not random.
+_nonce_seq = itertools.count(1)
+
+
+def _nonce() -> str:
+    return f"{next(_nonce_seq):08x}"
+
+
 def _is_valid_handle(h) -> bool:
     return h is not None and h != 0 and h != _INVALID_HANDLE
 
 
+# Index of the pipe we last connected on; Discord keeps the same one for its
+# whole lifetime, so reconnects try it before scanning.
+_last_pipe = 0
+
+
 def _open_pipe() -> Optional[int]:
-    """Connect to the first available Discord IPC pipe."""
-    for i in range(10):
+    """Connect to the first available Discord IPC pipe (opened for overlapped I/O)."""
+    global _last_pipe
+    order = [_last_pipe] + [i for i in range(10) if i != _last_pipe]
+    for i in order:
         path = f"\\\\.\\pipe\\discord-ipc-{i}"
         try:
             handle = _CreateFileW(
-                path, _GENERIC_RW, 0, None, _OPEN_EXISTING, 0, None
+                path, _GENERIC_RW, 0, None, _OPEN_EXISTING, _FILE_FLAG_OVERLAPPED, None
             )
         except OSError as e:
             log.debug("Pipe %d unavailable: %s", i, e)
             continue
         if _is_valid_handle(handle):
             log.debug("Connected to Discord pipe %d", i)
+            _last_pipe = i
             return handle
     return None
 
 
-def _write(handle: int, op: int, payload: dict):
-    data = json.dumps(payload).encode("utf-8")
-    header = struct.pack("<II", op, len(data))
-    buf = header + data
-    written = ctypes.wintypes.DWORD(0)
-    if not _WriteFile(handle, buf, len(buf), ctypes.byref(written), None):
+class _PipeBroken(Exception):
+    """Raised when the Discord IPC pipe is no longer readable."""
+
+
+def _overlapped_io(fn, handle: int, buf, size: int, timeout_ms: Optional[int]) -> int:
+    """Issue one overlapped ReadFile/WriteFile and wait for it to complete.
+
+    Returns the number of bytes transferred, or ``0`` if ``timeout_ms``
+    elapsed first (the pending request is cancelled).  ``None`` waits forever.
+    """
+    ov = _OVERLAPPED()
+    ov.hEvent = _CreateEventW(None, True, False, None)
+    if not ov.hEvent:
+        raise _PipeBroken("CreateEventW failed")
+    try:
+        transferred = ctypes.wintypes.DWORD(0)
+        if not fn(handle, buf, size, None, ctypes.byref(ov)):
+            err = ctypes.get_last_error()
+            if err != _ERROR_IO_PENDING:
+                raise _PipeBroken(f"Pipe I/O failed (error {err})")
+            wait_ms = 0xFFFFFFFF if timeout_ms is None else max(0, int(timeout_ms))
+            if _WaitForSingleObject(ov.hEvent, wait_ms) != _WAIT_OBJECT_0:
+                _CancelIoEx(handle, ctypes.byref(ov))
+                # The request may have completed before the cancel landed, so
+                # let GetOverlappedResult decide whether any bytes arrived.
+                if not _GetOverlappedResult(handle, ctypes.byref(ov), ctypes.byref(transferred), True):
+                    return 0
+                return transferred.value
+        if not _GetOverlappedResult(handle, ctypes.byref(ov), ctypes.byref(transferred), True):
+            raise _PipeBroken(f"GetOverlappedResult failed (error {ctypes.get_last_error()})")
+        return transferred.value
+    finally:
+        _CloseHandle(ov.hEvent)
+
+
+def _write_frame(handle: int, op: int, data: bytes):
+    buf = _HDR.pack(op, len(data)) + data
+    if _overlapped_io(_WriteFile, handle, buf, len(buf), None) != len(buf):
         raise _PipeBroken("WriteFile failed")
 
 
-class _PipeBroken(Exception):
-    """Raised when the Discord IPC pipe is no longer readable."""
+def _encode_handshake(client_id: str) -> bytes:
+    return b'{"v":1,"client_id":%b}' % _dumps(str(client_id))
+
+
+def _encode_join_invite(user_id: str, nonce: str) -> bytes:
+    return (
+        b'{"cmd":"SEND_ACTIVITY_JOIN_INVITE","args":{"user_id":%b},"nonce":"%b"}'
+        % (_dumps(str(user_id)), nonce.encode())
+    )
+
 
+_RX_CHUNK = 64 * 1024
 
-def _read(handle: int, timeout_ms: int = 5000) -> Optional[dict]:
+
+def _fill(handle: int, rx: bytearray, scratch, deadline: float) -> bool:
+    """Append whatever the pipe has ready (up to ``len(scratch)``) to ``rx``.
+
+    ``scratch`` is a reusable ctypes buffer owned by the caller, so a read
+    costs one kernel crossing and one copy of the bytes actually received.
+    One ReadFile usually brings in a whole frame, header and body together.
+    Returns ``False`` if nothing arrived before ``deadline``.
+    """
+    remaining_ms = (deadline - time.monotonic()) * 1000.0
+    if remaining_ms <= 0:
+        return False
+    n = _overlapped_io(_ReadFile, handle, scratch, len(scratch), remaining_ms)
+    if n == 0:
+        return False
+    rx += memoryview(scratch)[:n]
+    return True
+
+
+def _read(handle: int, rx: bytearray, scratch, timeout_ms: int = 5000) -> Optional[dict]:
     """Blocking read of a single RPC frame with timeout.
 
-    Returns the parsed JSON dict, ``None`` on timeout, or raises
-    ``_PipeBroken`` if the pipe has been closed by Discord.
+    ``rx`` carries bytes already received but not yet parsed, so frames that
+    arrived in the same read are returned without touching the pipe.  The
+    thread sleeps in the kernel until data arrives.  Returns the parsed JSON
+    dict, ``None`` on timeout, or raises ``_PipeBroken`` if the pipe has been
+    closed by Discord.
     """
     deadline = time.monotonic() + timeout_ms / 1000.0
-    peek_failures = 0
-    while time.monotonic() < deadline:
-        avail = ctypes.wintypes.DWORD(0)
-        ok = _PeekNamedPipe(handle, None, 0, None, ctypes.byref(avail), None)
-        if not ok:
-            peek_failures += 1
-            if peek_failures > 3:
-                raise _PipeBroken("PeekNamedPipe failed repeatedly")
-            time.sleep(0.1)
-            continue
-        peek_failures = 0
-        if avail.value >= 8:
-            break
-        time.sleep(0.05)
-    else:
-        return None
-
-    header_buf = ctypes.create_string_buffer(8)
-    read_n = ctypes.wintypes.DWORD(0)
-    if not _ReadFile(handle, header_buf, 8, ctypes.byref(read_n), None):
-        raise _PipeBroken("ReadFile header failed")
-    if read_n.value < 8:
-        raise _PipeBroken("Short header read")
-    op, length = struct.unpack("<II", header_buf.raw)
+    while len(rx) < 8:
+        if not _fill(handle, rx, scratch, deadline):
+            if not rx:
+                return None
+            raise _PipeBroken("Timed out mid-header")
+    op, length = _HDR.unpack_from(rx, 0)
 
     if length > 1024 * 1024:
         raise _PipeBroken(f"Implausible frame length: {length}")
 
-    body_buf = ctypes.create_string_buffer(length)
-    if not _ReadFile(handle, body_buf, length, ctypes.byref(read_n), None):
-        raise _PipeBroken("ReadFile body failed")
+    # Once a header has arrived the body is already in flight; give it a
+    # fresh window rather than whatever was left of the caller's timeout.
+    body_deadline = time.monotonic() + 5.0
+    while len(rx) < 8 + length:
+        if not _fill(handle, rx, scratch, body_deadline):
+            raise _PipeBroken("Timed out mid-frame")
+    body = bytes(rx[8:8 + length])
+    del rx[:8 + length]
     try:
-        return json.loads(body_buf.raw[: read_n.value].decode("utf-8"))
-    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        return _loads(body)
+    except _JSONError as e:
         log.warning("Invalid RPC frame JSON: %s", e)
         raise _PipeBroken("Invalid JSON in RPC frame")
 
@@ -122,6 +249,8 @@ class DiscordEventListener:
         self._client_id = client_id
         self._on_join = on_join
         self._handle: Optional[int] = None
+        self._rx_buf = bytearray()
+        self._rx_scratch = ctypes.create_string_buffer(_RX_CHUNK)
         self._thread: Optional[threading.Thread] = None
         self._stop = threading.Event()
 
@@ -143,6 +272,7 @@ class DiscordEventListener:
         while not self._stop.is_set():
             try:
                 self._handle = _open_pipe()
+                self._rx_buf = bytearray()
                 if self._handle is None:
                     log.debug("No Discord pipe found, retrying in 10s")
                     self._stop.wait(10)
@@ -164,30 +294,24 @@ class DiscordEventListener:
                 self._stop.wait(5)
 
     def _handshake(self):
-        _write(self._handle, 0, {"v": 1, "client_id": self._client_id})
-        resp = _read(self._handle, timeout_ms=5000)
+        _write_frame(self._handle, 0, _encode_handshake(self._client_id))
+        resp = _read(self._handle, self._rx_buf, self._rx_scratch, timeout_ms=5000)
         if resp is None:
             raise ConnectionError("Handshake timeout")
         log.debug("Event listener handshake OK")
 
     def _subscribe(self):
-        _write(self._handle, 1, {
-            "cmd": "SUBSCRIBE", "evt": "ACTIVITY_JOIN",
-            "nonce": os.urandom(4).hex(),
-        })
-        _read(self._handle, timeout_ms=3000)
-
-        _write(self._handle, 1, {
-            "cmd": "SUBSCRIBE", "evt": "ACTIVITY_JOIN_REQUEST",
-            "nonce": os.urandom(4).hex(),
-        })
-        _read(self._handle, timeout_ms=3000)
+        _write_frame(self._handle, 1, _SUB_JOIN % _nonce().encode())
+        _read(self._handle, self._rx_buf, self._rx_scratch, timeout_ms=3000)
+
+        _write_frame(self._handle, 1, _SUB_JOIN_REQUEST % _nonce().encode())
+        _read(self._handle, self._rx_buf, self._rx_scratch, timeout_ms=3000)
         log.debug("Subscribed to join events")
 
     def _event_loop(self):
         while not self._stop.is_set():
             try:
-                data = _read(self._handle, timeout_ms=2000)
+                data = _read(self._handle, self._rx_buf, self._rx_scratch, timeout_ms=2000)
             except _PipeBroken as e:
                 log.debug("Event pipe broken, will reconnect: %s", e)
                 return
@@ -212,10 +336,6 @@ class DiscordEventListener:
                 log.info("Auto-accepting join from %s", uname)
                 if uid:
                     try:
-                        _write(self._handle, 1, {
-                            "cmd": "SEND_ACTIVITY_JOIN_INVITE",
-                            "args": {"user_id": uid},
-                            "nonce": os.urandom(4).hex(),
-                        })
+                        _write_frame(self._handle, 1, _encode_join_invite(uid, _nonce()))
                     except Exception as e:
                         log.debug("SEND_ACTIVITY_JOIN_INVITE failed: %s", e)
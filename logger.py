@@ -1,7 +1,10 @@
+import atexit
 import logging
 import os
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+from typing import Optional
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 
 def _log_dir() -> str:
@@ -17,22 +20,37 @@ _fmt = logging.Formatter(
     datefmt="%Y-%m-%d %H:%M:%S",
 )
 
+# Calling threads only enqueue records; one background thread owns the file
+# (including rotation) and the console stream.
+_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+_listener: Optional[QueueListener] = None
 
-def get_logger(name: str = "erp") -> logging.Logger:
-    log = logging.getLogger(name)
-    if log.handlers:
-        return log
-
-    log.setLevel(logging.DEBUG)
 
+def _start_listener() -> QueueListener:
     fh = RotatingFileHandler(LOG_PATH, maxBytes=2 * 1024 * 1024, backupCount=3, encoding="utf-8")
     fh.setLevel(logging.DEBUG)
     fh.setFormatter(_fmt)
-    log.addHandler(fh)
 
     ch = logging.StreamHandler(sys.stderr)
     ch.setLevel(logging.INFO)
     ch.setFormatter(logging.Formatter("%(message)s"))
-    log.addHandler(ch)
+
+    listener = QueueListener(_queue, fh, ch, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def get_logger(name: str = "erp") -> logging.Logger:
+    global _listener
+    log = logging.getLogger(name)
+    if log.handlers:
+        return log
+
+    if _listener is None:
+        _listener = _start_listener()
+
+    log.setLevel(logging.DEBUG)
+    log.addHandler(QueueHandler(_queue))
 
     return log
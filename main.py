@@ -8,24 +8,30 @@ playback on the receiving end.
 
 import atexit
 import ctypes
+import functools
 import os
+import re
 import sys
 import threading
-import time
 import urllib.parse
+import webbrowser
+from types import SimpleNamespace
+from typing import Optional, Tuple
 
 # --noconsole builds set stdout/stderr to None; redirect to devnull so prints
 # don't crash the process.
-if sys.stdout is None:
-    sys.stdout = open(os.devnull, "w")
-if sys.stderr is None:
-    sys.stderr = open(os.devnull, "w")
-
-_app_dir = (
-    os.path.dirname(os.path.abspath(sys.executable))
-    if getattr(sys, "frozen", False)
-    else os.path.dirname(os.path.abspath(__file__))
-)
+if sys.stdout is None or sys.stderr is None:
+    _devnull = open(os.devnull, "w")
+    if sys.stdout is None:
+        sys.stdout = _devnull
+    if sys.stderr is None:
+        sys.stderr = _devnull
+
+_EXE_PATH = os.path.abspath(sys.executable)
+_EXE_DIR = os.path.dirname(_EXE_PATH)
+_SRC_PATH = os.path.abspath(__file__)
+_SRC_DIR = os.path.dirname(_SRC_PATH)
+_app_dir = _EXE_DIR if getattr(sys, "frozen", False) else _SRC_DIR
 if _app_dir and _app_dir not in sys.path:
     sys.path.insert(0, _app_dir)
 
@@ -34,6 +40,16 @@ from logger import get_logger, LOG_PATH
 log = get_logger("erp.main")
 
 _ICON_NAME = "Apple_Music_Icon.png"
+# LOG_PATH is fixed for the run; encode it and its menu label once.
+_LOG_PATH_CLIP = LOG_PATH.encode("utf-16-le") + b"\x00\x00"
+_LOG_MENU_TEXT = f"Log: {os.path.basename(LOG_PATH)}"
+_TIP_PREFIX = "EternalRichPresence | "
+_TIP_IDLE = _TIP_PREFIX + "Idle"
+_URI_PREFIX = "eternalrp://"
+# The exact shape presence.py builds for join secrets and copied links.
+_SYNC_URI_RE = re.compile(
+    r"eternalrp://sync\?track=([^&]*)&artist=([^&]*)(?:&pos=(\d+))?\Z"
+)
 
 
 def _create_default_config():
@@ -74,32 +90,226 @@ def _msgbox(text: str, title: str = "EternalRichPresence", info: bool = False):
         log.warning("MessageBox failed: %s", e)
 
 
+def _set_clipboard_text(text: str):
+    """Put ``text`` on the Windows clipboard as CF_UNICODETEXT; raises OSError on failure."""
+    _set_clipboard_utf16(text.encode("utf-16-le") + b"\x00\x00")
+
+
+@functools.lru_cache(maxsize=None)
+def _clipboard_api() -> SimpleNamespace:
+    """The clipboard/global-memory exports, bound once with declared signatures."""
+    from ctypes import wintypes
+    from utils import bind_winapi
+    user32 = ctypes.WinDLL("user32", use_last_error=True)
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    return SimpleNamespace(
+        OpenClipboard=bind_winapi(user32, "OpenClipboard", wintypes.BOOL, wintypes.HWND),
+        EmptyClipboard=bind_winapi(user32, "EmptyClipboard", wintypes.BOOL),
+        SetClipboardData=bind_winapi(
+            user32, "SetClipboardData", wintypes.HANDLE, wintypes.UINT, wintypes.HANDLE
+        ),
+        CloseClipboard=bind_winapi(user32, "CloseClipboard", wintypes.BOOL),
+        GlobalAlloc=bind_winapi(
+            kernel32, "GlobalAlloc", wintypes.HGLOBAL, wintypes.UINT, ctypes.c_size_t
+        ),
+        GlobalLock=bind_winapi(kernel32, "GlobalLock", wintypes.LPVOID, wintypes.HGLOBAL),
+        GlobalUnlock=bind_winapi(kernel32, "GlobalUnlock", wintypes.BOOL, wintypes.HGLOBAL),
+        GlobalFree=bind_winapi(kernel32, "GlobalFree", wintypes.HGLOBAL, wintypes.HGLOBAL),
+    )
+
+
+_CF_UNICODETEXT = 13
+_GMEM_MOVEABLE = 0x0002
+
+
+def _set_clipboard_utf16(data: bytes):
+    """Like :func:`_set_clipboard_text` for NUL-terminated UTF-16-LE ``data``."""
+    api = _clipboard_api()
+    if not api.OpenClipboard(None):
+        raise ctypes.WinError(ctypes.get_last_error())
+    try:
+        if not api.EmptyClipboard():
+            raise ctypes.WinError(ctypes.get_last_error())
+        handle = api.GlobalAlloc(_GMEM_MOVEABLE, len(data))
+        if not handle:
+            raise ctypes.WinError(ctypes.get_last_error())
+        ptr = api.GlobalLock(handle)
+        if not ptr:
+            api.GlobalFree(handle)
+            raise ctypes.WinError(ctypes.get_last_error())
+        ctypes.memmove(ptr, data, len(data))
+        api.GlobalUnlock(handle)
+        # On success the clipboard owns the memory; otherwise it's still ours.
+        if not api.SetClipboardData(_CF_UNICODETEXT, handle):
+            api.GlobalFree(handle)
+            raise ctypes.WinError(ctypes.get_last_error())
+    finally:
+        api.CloseClipboard()
+
+
+# Console control events after which Windows terminates the process as soon
+# as the handler returns (CTRL_CLOSE, CTRL_LOGOFF, CTRL_SHUTDOWN).
+_CTRL_TERMINAL_EVENTS = (2, 5, 6)
+_CTRL_TEARDOWN_WAIT = 4.0
+
+
+def _install_console_ctrl_handler(on_stop, teardown_done: threading.Event):
+    """Route Ctrl+C/Ctrl+Break, console close, logoff and shutdown to ``on_stop``.
+
+    Python signal handlers only run between bytecodes on the main thread, so
+    they never fire while it is blocked in ``Event.wait()`` or the tray's
+    message loop.  A console control handler runs on its own OS thread.  For
+    close/logoff/shutdown it holds the process until ``teardown_done`` is
+    set (or the OS grace period is nearly up) so the presence gets cleared.
+
+    Returns the installed callback, which must be kept alive, or ``None``.
+    """
+    from ctypes import wintypes
+    handler_type = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.DWORD)
+
+    def _handler(ctrl_type):
+        on_stop()
+        if ctrl_type in _CTRL_TERMINAL_EVENTS:
+            teardown_done.wait(_CTRL_TEARDOWN_WAIT)
+        return True
+
+    handler = handler_type(_handler)
+    try:
+        if ctypes.windll.kernel32.SetConsoleCtrlHandler(handler, True):
+            return handler
+    except Exception as e:
+        log.debug("SetConsoleCtrlHandler failed: %s", e)
+    return None
+
+
+@functools.lru_cache(maxsize=1)
 def _icon_path():
     """Resolve the tray icon image, checking PyInstaller bundle first."""
     if getattr(sys, "frozen", False):
         meipass = os.path.join(getattr(sys, "_MEIPASS", ""), _ICON_NAME)
         if os.path.isfile(meipass):
             return meipass
-        beside_exe = os.path.join(
-            os.path.dirname(os.path.abspath(sys.executable)), _ICON_NAME
-        )
+        beside_exe = os.path.join(_EXE_DIR, _ICON_NAME)
         if os.path.isfile(beside_exe):
             return beside_exe
-    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), _ICON_NAME)
+    src = os.path.join(_SRC_DIR, _ICON_NAME)
     if os.path.isfile(src):
         return src
     return None
 
 
+_tray_icon = None
+_tray_icon_lock = threading.Lock()
+
+
 def _load_tray_icon():
-    from PIL import Image
-    path = _icon_path()
-    if path:
-        try:
-            return Image.open(path)
-        except Exception as e:
-            log.warning("Could not load tray icon from %s: %s", path, e)
-    return Image.new("RGB", (64, 64), (252, 60, 68))
+    global _tray_icon
+    with _tray_icon_lock:
+        if _tray_icon is not None:
+            return _tray_icon
+        from PIL import Image
+        path = _icon_path()
+        icon = None
+        if path:
+            try:
+                # Decode now and drop the file handle; the tray re-renders
+                # from this one in-memory image.
+                with Image.open(path) as img:
+                    img.load()
+                    icon = img.convert("RGBA")
+            except Exception as e:
+                log.warning("Could not load tray icon from %s: %s", path, e)
+        if icon is None:
+            icon = Image.new("RGB", (64, 64), (252, 60, 68))
+        _tray_icon = icon
+        return icon
+
+
+def _parse_sync_query(qs: str) -> Tuple[str, str, int]:
+    """Pull ``track``, ``artist`` and ``pos`` out of a sync query string.
+
+    Same results as ``parse_qs`` for these keys (first non-empty value wins,
+    ``+`` decodes to a space) without building a dict of lists; other keys
+    are never decoded.
+    """
+    track = artist = pos = None
+    for pair in qs.split("&"):
+        if not pair:
+            continue
+        key, _, value = pair.partition("=")
+        if not value:
+            continue
+        if key == "track":
+            if track is None:
+                track = urllib.parse.unquote_plus(value)
+        elif key == "artist":
+            if artist is None:
+                artist = urllib.parse.unquote_plus(value)
+        elif key == "pos" and pos is None:
+            pos = value
+    try:
+        position = int(pos) if pos is not None else 0
+    except ValueError:
+        position = 0
+    return track or "Unknown Track", artist or "", position
+
+
+_DEFAULT_REDIRECT_URI = "http://localhost:8888/callback"
+
+# Parsed once from config.py; see _load_config().
+_CFG: Optional[SimpleNamespace] = None
+
+
+def _load_config(reload: bool = False) -> SimpleNamespace:
+    """Read the settings from config.py once and cache them in ``_CFG``.
+
+    ``client_id`` is ``None`` when config.py (or its CLIENT_ID) is missing.
+    Pass ``reload=True`` after the setup GUI has rewritten the file.
+    """
+    global _CFG
+    if _CFG is not None and not reload:
+        return _CFG
+    from utils import read_config_values
+    config = read_config_values(os.path.join(_app_dir, "config.py"))
+
+    def _get(name: str, default=""):
+        return config.get(name, default) if config is not None else default
+
+    _CFG = SimpleNamespace(
+        client_id=_get("CLIENT_ID", None),
+        asset_key=(_get("ASSET_KEY", "apple_music") or "apple_music").strip(),
+        spotify_client_id=_get("SPOTIFY_CLIENT_ID"),
+        spotify_client_secret=_get("SPOTIFY_CLIENT_SECRET"),
+        spotify_redirect_uri=_get("SPOTIFY_REDIRECT_URI") or _DEFAULT_REDIRECT_URI,
+    )
+    return _CFG
+
+
+def _client_id_set(cfg: SimpleNamespace) -> bool:
+    return bool(cfg.client_id) and cfg.client_id != "YOUR_DISCORD_CLIENT_ID"
+
+
+_spotify_for_join = None
+_spotify_for_join_lock = threading.Lock()
+
+
+def _listener_spotify():
+    """Return the SpotifyProvider used for Listen Along, built on first use.
+
+    ``None`` when Spotify isn't configured.  Reused across join events so the
+    spotipy import and OAuth setup happen once per process.
+    """
+    global _spotify_for_join
+    cfg = _load_config()
+    if not (cfg.spotify_client_id and cfg.spotify_client_secret):
+        return None
+    with _spotify_for_join_lock:
+        if _spotify_for_join is None:
+            from providers.spotify import SpotifyProvider
+            _spotify_for_join = SpotifyProvider(
+                cfg.spotify_client_id, cfg.spotify_client_secret, cfg.spotify_redirect_uri
+            )
+        return _spotify_for_join
 
 
 def run_listener_mode(uri: str) -> int:
@@ -111,24 +321,23 @@ def run_listener_mode(uri: str) -> int:
     artist_name = ""
     position_sec = 0
 
-    if uri.startswith("eternalrp://"):
-        rest = uri[len("eternalrp://"):]
-        if "?" in rest:
-            _, qs = rest.split("?", 1)
-            params = urllib.parse.parse_qs(qs)
-            if "track" in params and params["track"]:
-                track_name = urllib.parse.unquote(params["track"][0])
-            if "artist" in params and params["artist"]:
-                artist_name = urllib.parse.unquote(params["artist"][0])
-            if "pos" in params and params["pos"]:
-                try:
-                    position_sec = int(params["pos"][0])
-                except (ValueError, TypeError):
-                    position_sec = 0
+    m = _SYNC_URI_RE.match(uri)
+    if m:
+        track_name = urllib.parse.unquote_plus(m.group(1)) or track_name
+        artist_name = urllib.parse.unquote_plus(m.group(2))
+        if m.group(3):
+            position_sec = int(m.group(3))
+    else:
+        parts = urllib.parse.urlsplit(uri)
+        if parts.scheme != "eternalrp":
+            log.warning("[SYNC] Ignoring non-eternalrp URI: %r", uri[:64])
+            return 1
+        if parts.query:
+            track_name, artist_name, position_sec = _parse_sync_query(parts.query)
         else:
-            track_name = urllib.parse.unquote(
-                rest.replace("/", "").strip() or "Unknown Track"
-            )
+            # eternalrp://<title>: keep slashes that are part of the title.
+            bare = (parts.netloc + parts.path).strip("/").strip()
+            track_name = urllib.parse.unquote(bare) or track_name
 
     display = f"{track_name} by {artist_name}" if artist_name else track_name
     log.info("[SYNC] Attempting to join %s at %ds", display, position_sec)
@@ -136,15 +345,8 @@ def run_listener_mode(uri: str) -> int:
     position_ms = position_sec * 1000
 
     try:
-        from config import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET
-        if SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET:
-            from providers.spotify import SpotifyProvider
-            try:
-                from config import SPOTIFY_REDIRECT_URI
-            except ImportError:
-                SPOTIFY_REDIRECT_URI = "http://localhost:8888/callback"
-            redirect = SPOTIFY_REDIRECT_URI or "http://localhost:8888/callback"
-            sp = SpotifyProvider(SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, redirect)
+        sp = _listener_spotify()
+        if sp is not None:
             if sp.search_and_play(track_name, artist_name, position_ms=position_ms):
                 log.info("Playback started on Spotify: %s at %ds", display, position_sec)
                 return 0
@@ -185,7 +387,6 @@ def run_listener_mode(uri: str) -> int:
             + urllib.parse.quote(search_query, safe="")
         )
         try:
-            import webbrowser
             webbrowser.open(search_url)
             log.info("Opened Apple Music search fallback: %s", search_url)
         except Exception as e:
@@ -202,26 +403,16 @@ def run_host_mode() -> int:
     log.info("Starting host mode")
 
     # --- validate / create config first ---
-    needs_setup = False
-    try:
-        from config import CLIENT_ID
-        if not CLIENT_ID or CLIENT_ID == "YOUR_DISCORD_CLIENT_ID":
-            needs_setup = True
-    except ImportError:
-        needs_setup = True
-
-    if needs_setup:
+    cfg = _load_config()
+    if not _client_id_set(cfg):
         log.info("Config missing or incomplete — launching setup GUI")
         try:
             from setup_gui import run_setup_gui
             if not run_setup_gui():
                 log.info("Setup cancelled by user")
                 return 1
-            import importlib
-            if "config" in sys.modules:
-                importlib.reload(sys.modules["config"])
-            from config import CLIENT_ID
-            if not CLIENT_ID or CLIENT_ID == "YOUR_DISCORD_CLIENT_ID":
+            cfg = _load_config(reload=True)
+            if not _client_id_set(cfg):
                 _msgbox("Discord Client ID is still not set. Please try again.")
                 return 1
         except Exception as e:
@@ -235,44 +426,42 @@ def run_host_mode() -> int:
             )
             return 1
 
-    # --- load providers ---
-    try:
-        from providers.apple_music import AppleMusicProvider
-    except Exception as e:
-        log.exception("Failed to load Apple Music provider")
-        _msgbox(f"Failed to load Apple Music provider:\n{e}")
-        return 1
-
     from manager import ProviderManager
 
-    provider_list = [AppleMusicProvider()]
+    def _build_manager() -> ProviderManager:
+        """Import and construct the providers (winrt, iTunes COM, spotipy/OAuth).
 
-    try:
-        from config import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET
-        if SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET:
-            from providers.spotify import SpotifyProvider
-            try:
-                from config import SPOTIFY_REDIRECT_URI
-            except ImportError:
-                SPOTIFY_REDIRECT_URI = ""
-            redirect = SPOTIFY_REDIRECT_URI or "http://localhost:8888/callback"
-            provider_list.append(
-                SpotifyProvider(SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, redirect)
-            )
-            log.info("Spotify provider loaded")
-    except (ImportError, Exception):
-        log.debug("Spotify provider not loaded", exc_info=True)
+        Runs on the poll thread, so none of it delays the tray icon.
+        """
+        from providers.apple_music import AppleMusicProvider
+        provider_list = [AppleMusicProvider()]
 
-    mgr = ProviderManager(provider_list)
+        try:
+            if cfg.spotify_client_id and cfg.spotify_client_secret:
+                from providers.spotify import SpotifyProvider
+                provider_list.append(
+                    SpotifyProvider(
+                        cfg.spotify_client_id, cfg.spotify_client_secret, cfg.spotify_redirect_uri
+                    )
+                )
+                log.info("Spotify provider loaded")
+        except (ImportError, Exception):
+            log.debug("Spotify provider not loaded", exc_info=True)
 
-    try:
-        from config import ASSET_KEY
-    except ImportError:
-        ASSET_KEY = "apple_music"
+        return ProviderManager(provider_list)
+
+    # Built by the poll thread so the tray icon doesn't wait on iTunes COM
+    # activation or the first SMTC manager request.
+    mgr: Optional[ProviderManager] = None
 
     from presence import DiscordPresence
+    from utils import DaemonExecutor, quote_component
+
+    # Set by provider change events, finished cover uploads and on stop to
+    # cut the poll wait short.
+    wake = threading.Event()
 
-    dp = DiscordPresence(CLIENT_ID, asset_key=(ASSET_KEY or "apple_music").strip())
+    dp = DiscordPresence(cfg.client_id, asset_key=cfg.asset_key, on_cover_ready=wake.set)
 
     def _cleanup():
         dp.disconnect()
@@ -281,18 +470,16 @@ def run_host_mode() -> int:
 
     # --- Discord event listener (receives ACTIVITY_JOIN from Discord) ---
     evt_listener = None
+    # Joins are handled one at a time on a single reused worker.
+    join_pool = DaemonExecutor(max_workers=1, thread_name_prefix="erp-join")
     try:
         from discord_events import DiscordEventListener
 
         def _on_join_event(secret: str):
             log.info("ACTIVITY_JOIN received via event listener: %s", secret)
-            threading.Thread(
-                target=run_listener_mode,
-                args=(secret,),
-                daemon=True,
-            ).start()
+            join_pool.submit(run_listener_mode, secret)
 
-        evt_listener = DiscordEventListener(CLIENT_ID, _on_join_event)
+        evt_listener = DiscordEventListener(cfg.client_id, _on_join_event)
         evt_listener.start()
         log.info("Discord event listener started")
     except Exception as e:
@@ -301,13 +488,56 @@ def run_host_mode() -> int:
     # --- background poll loop ---
     stop_event = threading.Event()
     paused = threading.Event()
+    startup_failed = threading.Event()
     interval = 5
+    idle_max = 60
+
+    def _shutdown():
+        """Stop the poll loop and the tray; safe to call from any thread, repeatedly."""
+        stop_event.set()
+        wake.set()
+        if tray:
+            try:
+                tray.stop()
+            except Exception as e:
+                log.debug("Tray stop: %s", e)
 
     def _poll_loop():
+        # This thread creates the iTunes COM object and makes every call on
+        # it, so it needs a COM apartment of its own.
+        try:
+            import pythoncom
+        except ImportError:
+            pythoncom = None
+        if pythoncom is not None:
+            pythoncom.CoInitialize()
+        try:
+            _poll()
+        finally:
+            if pythoncom is not None:
+                pythoncom.CoUninitialize()
+
+    def _poll():
+        nonlocal mgr
+        try:
+            manager = _build_manager()
+        except Exception as e:
+            log.exception("Failed to start music providers")
+            _msgbox(f"Failed to start music providers:\n{e}")
+            startup_failed.set()
+            _shutdown()
+            return
+        # Event-driven providers only need the timer as a periodic resync.
+        idle_interval = 30 if manager.subscribe(wake.set) else interval
+        mgr = manager
+
+        idle_polls = 0
+        t = None
+        last_tip = None
         while not stop_event.is_set():
             if not paused.is_set():
                 try:
-                    if dp._rpc is None:
+                    if dp._rpc is None and not dp.connect_due_in():
                         try:
                             dp.connect()
                             log.info("Connected to Discord RPC")
@@ -315,61 +545,96 @@ def run_host_mode() -> int:
                             log.debug("Discord RPC connect retry failed: %s", e)
 
                     if dp._rpc is not None:
-                        t = mgr.get_now_playing()
+                        t = manager.get_now_playing()
+                        active = manager.active_provider
                         if t is None:
+                            idle_polls += 1
                             dp.clear()
                         else:
-                            name = mgr.active_provider.name if mgr.active_provider else ""
-                            dp.update(t, name)
+                            idle_polls = 0
+                            dp.update(t, active.name if active else "")
                         if tray:
                             if t:
-                                src = mgr.active_provider.name if mgr.active_provider else "?"
-                                tip = f"EternalRichPresence | {src}\n{t.title} — {t.artist}"
+                                src = active.name if active else "?"
+                                tip = "".join(
+                                    (_TIP_PREFIX, src, "\n", t.title, " — ", t.artist)
+                                )[:127]
                             else:
-                                tip = "EternalRichPresence | Idle"
-                            tray.title = tip[:127]
+                                tip = _TIP_IDLE
+                            # Every assignment is a Shell_NotifyIcon call.
+                            if tip != last_tip:
+                                tray.title = tip
+                                last_tip = tip
                 except Exception as e:
                     dp._rpc = None
                     log.warning("Poll error (will retry): %s", e)
-            stop_event.wait(interval)
-
-    poll_thread = threading.Thread(target=_poll_loop, daemon=True)
-    poll_thread.start()
+            if dp._rpc is None:
+                # DiscordPresence paces its own reconnect attempts.
+                delay = dp.connect_due_in() or interval
+            elif idle_polls:
+                # Nothing playing: back off 10 s, 20 s, 40 s, then every minute.
+                delay = max(idle_interval, min(idle_max, interval * 2 ** min(idle_polls, 4)))
+            else:
+                delay = idle_interval
+                hint = manager.suggested_poll_delay()
+                if hint:
+                    delay = max(delay, hint)
+                # Wake just after the current track should end so the next one
+                # shows up without waiting out the rest of the interval.
+                if t is not None and t.is_playing and t.duration_sec and t.position_sec is not None:
+                    remaining = t.duration_sec - t.position_sec
+                    if remaining > 0:
+                        delay = min(delay, remaining + 1)
+                flush_in = dp.flush_due_in()
+                if flush_in is not None:
+                    delay = min(delay, flush_in + 0.1)
+            wake.wait(delay)
+            wake.clear()
 
     # --- system tray ---
     tray = None
 
-    import signal
+    poll_thread = threading.Thread(target=_poll_loop, daemon=True)
+    poll_thread.start()
 
-    def _sigint_handler(_sig, _frame):
-        stop_event.set()
-        if tray:
-            try:
-                tray.stop()
-            except Exception as e:
-                log.debug("Tray stop on SIGINT: %s", e)
+    import signal
 
-    signal.signal(signal.SIGINT, _sigint_handler)
+    signal.signal(signal.SIGINT, lambda _sig, _frame: _shutdown())
+    signal.signal(signal.SIGTERM, lambda _sig, _frame: _shutdown())
+    teardown_done = threading.Event()
+    ctrl_handler = _install_console_ctrl_handler(_shutdown, teardown_done)
 
     try:
         import pystray
 
         icon_image = _load_tray_icon()
 
+        np_label_key = np_label = None
+
         def _now_playing_label(_item):
+            nonlocal np_label_key, np_label
             t = dp.current_track
             if paused.is_set():
                 return "Paused"
             if t is None:
                 return "No track playing"
-            label = t.title
-            if t.artist and t.artist != "Unknown Artist":
-                label += f" — {t.artist}"
-            return label
+            key = (t.title, t.artist)
+            if key != np_label_key:
+                label = t.title
+                if t.artist and t.artist != "Unknown Artist":
+                    label += f" — {t.artist}"
+                np_label_key, np_label = key, label
+            return np_label
+
+        label_provider, provider_label = None, "Source: —"
 
         def _provider_label(_item):
-            p = mgr.active_provider
-            return f"Source: {p.name}" if p else "Source: —"
+            nonlocal label_provider, provider_label
+            p = mgr.active_provider if mgr is not None else None
+            if p is not label_provider:
+                label_provider = p
+                provider_label = f"Source: {p.name}" if p else "Source: —"
+            return provider_label
 
         def _discord_status_label(_item):
             return "Discord: Connected" if dp._rpc is not None else "Discord: Disconnected"
@@ -377,6 +642,7 @@ def run_host_mode() -> int:
         def on_toggle(_icon, _item):
             if paused.is_set():
                 paused.clear()
+                wake.set()
                 log.info("Resumed")
             else:
                 paused.set()
@@ -394,6 +660,9 @@ def run_host_mode() -> int:
             except Exception as e:
                 log.error("Reconnect failed: %s", e)
                 _msgbox(f"Reconnect failed:\n{e}")
+            finally:
+                # Skip any reconnect backoff the poll loop is sitting in.
+                wake.set()
 
         def on_open_log(_icon, _item):
             log.info("Opening log file: %s", LOG_PATH)
@@ -405,10 +674,7 @@ def run_host_mode() -> int:
 
         def on_copy_log_path(_icon, _item):
             try:
-                import subprocess
-                subprocess.run(
-                    ["clip"], input=LOG_PATH.encode(), check=True, creationflags=0x08000000
-                )
+                _set_clipboard_utf16(_LOG_PATH_CLIP)
                 log.debug("Log path copied to clipboard")
             except Exception as e:
                 log.warning("Clipboard copy failed: %s", e)
@@ -430,21 +696,27 @@ def run_host_mode() -> int:
                 info=True,
             )
 
-        def on_exit(icon, _item):
+        def on_exit(_icon, _item):
             log.info("Exit requested")
-            stop_event.set()
-            icon.stop()
+            _shutdown()
+
+        listen_link_key = listen_link = None
 
         def _build_listen_link():
             """Build the current Listen Along link from dp state."""
+            nonlocal listen_link_key, listen_link
             t = dp.current_track
             if t is None:
                 return None
-            import urllib.parse as _up
             pos = int(t.position_sec) if t.position_sec is not None else 0
-            safe_t = _up.quote(t.title[:80], safe="")
-            safe_a = _up.quote(t.artist[:40], safe="")
-            return f"eternalrp://sync?track={safe_t}&artist={safe_a}&pos={pos}"
+            # Position is bucketed so repeated clicks reuse the same link.
+            key = (t.title, t.artist, pos // 5)
+            if key != listen_link_key:
+                safe_t = quote_component(t.title[:80])
+                safe_a = quote_component(t.artist[:40])
+                listen_link_key = key
+                listen_link = f"{_URI_PREFIX}sync?track={safe_t}&artist={safe_a}&pos={pos}"
+            return listen_link
 
         def on_copy_listen_link(_icon, _item):
             link = _build_listen_link()
@@ -457,10 +729,7 @@ def run_host_mode() -> int:
                 )
                 return
             try:
-                import subprocess
-                subprocess.run(
-                    ["clip"], input=link.encode(), check=True, creationflags=0x08000000
-                )
+                _set_clipboard_text(link)
                 log.info("Listen Along link copied: %s", link)
             except Exception as e:
                 log.warning("Clipboard copy failed: %s — showing link in dialog", e)
@@ -475,9 +744,7 @@ def run_host_mode() -> int:
 
         debug_menu = pystray.Menu(
             pystray.MenuItem(_discord_status_label, lambda: None, enabled=False),
-            pystray.MenuItem(
-                lambda _item: f"Log: {os.path.basename(LOG_PATH)}", lambda: None, enabled=False
-            ),
+            pystray.MenuItem(_LOG_MENU_TEXT, lambda: None, enabled=False),
             pystray.Menu.SEPARATOR,
             pystray.MenuItem("Log Join Secret", on_log_join_secret),
             pystray.MenuItem("Open Log File", on_open_log),
@@ -505,7 +772,8 @@ def run_host_mode() -> int:
             "EternalRichPresence", icon_image, "EternalRichPresence", menu
         )
         log.info("System tray started")
-        tray.run()
+        if not stop_event.is_set():
+            tray.run()
     except Exception as e:
         log.exception("System tray failed")
         _msgbox(
@@ -513,31 +781,39 @@ def run_host_mode() -> int:
             "Falling back to console mode (Ctrl+C to quit)."
         )
         try:
-            while not stop_event.is_set():
-                time.sleep(1)
+            if ctrl_handler is not None:
+                stop_event.wait()
+            else:
+                while not stop_event.wait(1):
+                    pass
         except KeyboardInterrupt:
-            pass
+            _shutdown()
 
     # --- teardown ---
     log.info("Shutting down")
-    stop_event.set()
+    _shutdown()
     if evt_listener:
         evt_listener.stop()
+    join_pool.shutdown(cancel_futures=True)
     poll_thread.join(timeout=10)
     atexit.unregister(_cleanup)
     dp.disconnect()
+    if mgr is not None:
+        mgr.close()
+    teardown_done.set()
+    if ctrl_handler is not None:
+        ctypes.windll.kernel32.SetConsoleCtrlHandler(ctrl_handler, False)
 
-    return 0
+    return 1 if startup_failed.is_set() else 0
 
 
 def _clear_presence() -> int:
     """Connect to Discord RPC and forcibly clear any stuck activity."""
-    try:
-        from config import CLIENT_ID
-    except ImportError:
+    cfg = _load_config()
+    if cfg.client_id is None:
         _msgbox("config.py with CLIENT_ID required.")
         return 1
-    if not CLIENT_ID or CLIENT_ID == "YOUR_DISCORD_CLIENT_ID":
+    if not _client_id_set(cfg):
         _msgbox("Set CLIENT_ID in config.py.")
         return 1
     try:
@@ -546,20 +822,10 @@ def _clear_presence() -> int:
         _msgbox("pypresence is missing. Reinstall or rebuild the app.")
         return 1
 
-    rpc = Presence(CLIENT_ID)
+    rpc = Presence(cfg.client_id)
     try:
         rpc.connect()
         rpc.clear(pid=os.getpid())
-        try:
-            rpc.clear(pid=0)
-        except Exception as e:
-            log.debug("clear(pid=0) failed (non-fatal): %s", e)
-        try:
-            rpc.update(state="", details="", pid=os.getpid())
-            time.sleep(0.3)
-            rpc.clear(pid=os.getpid())
-        except Exception as e:
-            log.debug("Interim clear failed (non-fatal): %s", e)
         log.info("Rich Presence cleared")
     except Exception as e:
         log.error("Could not clear presence: %s", e, exc_info=True)
@@ -590,12 +856,33 @@ _BANNER = r"""
 """
 
 
+def _is_unprivileged_launch(args) -> bool:
+    """True for ``--clear`` and Listen Along invocations.
+
+    These run from an already-registered URI handler (or just talk to
+    Discord), so they neither need admin rights nor re-register protocols.
+    """
+    if "--clear" in args and "--register-uri" not in args:
+        return True
+    return any(a.startswith(_URI_PREFIX) or _extract_discord_join(a) for a in args)
+
+
 def main():
     if not getattr(sys, "frozen", False):
         print(_BANNER)
     log.info("EternalRichPresence starting (frozen=%s, dir=%s)", getattr(sys, "frozen", False), _app_dir)
     args = sys.argv[1:]
 
+    if _is_unprivileged_launch(args):
+        if "--clear" in args:
+            return _clear_presence()
+        for a in args:
+            if a.startswith(_URI_PREFIX):
+                return run_listener_mode(a)
+            secret = _extract_discord_join(a)
+            if secret:
+                return run_listener_mode(secret)
+
     try:
         from utils import register_uri_scheme
         if register_uri_scheme(silent=True):
@@ -608,8 +895,9 @@ def main():
         print(f"[!] eternalrp:// registration error: {e}")
 
     try:
-        from config import CLIENT_ID as _cid
-        if _cid and _cid != "YOUR_DISCORD_CLIENT_ID":
+        cfg = _load_config()
+        if _client_id_set(cfg):
+            _cid = cfg.client_id
             from utils import register_discord_launch
             if register_discord_launch(_cid, silent=True):
                 log.info("discord-%s:// protocol registered successfully", _cid)
@@ -628,16 +916,6 @@ def main():
         print(msg)
         return 0 if ok else 1
 
-    if "--clear" in args:
-        return _clear_presence()
-
-    for a in args:
-        if a.startswith("eternalrp://"):
-            return run_listener_mode(a)
-        secret = _extract_discord_join(a)
-        if secret:
-            return run_listener_mode(secret)
-
     return run_host_mode()
 
 
@@ -646,16 +924,18 @@ def _extract_discord_join(arg: str) -> str:
     if not arg.startswith("discord-"):
         return ""
     try:
-        rest = arg.split("://", 1)
-        if len(rest) < 2:
+        sep = arg.find("://", 8)
+        if sep < 0:
             return ""
-        path = rest[1]
-        if path.startswith("join/"):
-            secret = urllib.parse.unquote(path[5:])
+        start = sep + 3
+        if arg.startswith("join/", start):
+            secret = urllib.parse.unquote(arg[start + 5:])
         else:
-            secret = urllib.parse.unquote(path.lstrip("/"))
-        if secret.startswith("eternalrp://") or ("track=" in secret):
-            return secret if secret.startswith("eternalrp://") else f"eternalrp://sync?{secret}"
+            secret = urllib.parse.unquote(arg[start:].lstrip("/"))
+        if secret.startswith(_URI_PREFIX):
+            return secret
+        if "track=" in secret:
+            return f"{_URI_PREFIX}sync?{secret}"
         return ""
     except Exception as e:
         log.debug("_extract_discord_join failed for %r: %s", arg[:80] if arg else "", e)
@@ -672,12 +952,11 @@ def _is_admin() -> bool:
 
 def _elevate():
     """Re-launch the current process with UAC admin prompt."""
+    exe = _EXE_PATH
     if getattr(sys, "frozen", False):
-        exe = sys.executable
         params = " ".join(sys.argv[1:])
     else:
-        exe = sys.executable
-        params = f'"{os.path.abspath(__file__)}" ' + " ".join(sys.argv[1:])
+        params = f'"{_SRC_PATH}" ' + " ".join(sys.argv[1:])
     try:
         ctypes.windll.shell32.ShellExecuteW(
             None, "runas", exe, params.strip(), None, 1
@@ -687,7 +966,7 @@ def _elevate():
 
 
 if __name__ == "__main__":
-    if not _is_admin():
+    if not _is_unprivileged_launch(sys.argv[1:]) and not _is_admin():
         _elevate()
         sys.exit(0)
     try:
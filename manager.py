@@ -1,7 +1,11 @@
-from typing import List, Optional
+import dataclasses
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Callable, Dict, List, Optional, Tuple
 
 from logger import get_logger
 from providers.base import BaseProvider, TrackInfo
+from utils import DaemonExecutor
 
 log = get_logger("erp.manager")
 
@@ -9,23 +13,134 @@ log = get_logger("erp.manager")
 class ProviderManager:
     """Tries music providers in priority order, returning the first active result."""
 
+    # Polls the active provider may come back empty (e.g. between tracks)
+    # before lower-priority providers are asked again.  During those polls
+    # the last track is repeated, its position carried forward, so the
+    # presence is neither cleared nor seen as a seek.
+    _GRACE_POLLS = 2
+    # A provider that keeps returning nothing is retried after 1, 2, 4, ...
+    # seconds, up to this cap.  Any provider change event resets the backoff.
+    _BACKOFF_MAX = 30.0
+    # Upper bound on waiting for a probe started on the worker pool.
+    _PROBE_TIMEOUT = 10
+
     def __init__(self, providers: List[BaseProvider]):
         self._providers = providers
         self._active: Optional[BaseProvider] = None
+        self._misses = 0
+        # Last track returned and when (monotonic), repeated during grace.
+        self._last_track: Optional[Tuple[TrackInfo, float]] = None
+        # provider -> (next attempt, current delay), monotonic seconds
+        self._cooldowns: Dict[BaseProvider, Tuple[float, float]] = {}
+        # Lower-priority providers can be probed while the first one runs.
+        # The first one always runs on the calling thread: iTunes COM objects
+        # belong to the thread that created them.
+        self._pool: Optional[DaemonExecutor] = (
+            DaemonExecutor(len(providers) - 1, thread_name_prefix="erp-probe")
+            if len(providers) > 1 else None
+        )
+        # Last probe started for each provider on the pool.  One that is still
+        # running (timed out, or left behind when a higher provider answered)
+        # keeps its provider from being called again, so none runs twice at once.
+        self._probes: Dict[BaseProvider, Future] = {}
 
     @property
     def active_provider(self) -> Optional[BaseProvider]:
         return self._active
 
+    def _due(self, provider: BaseProvider, now: float) -> bool:
+        probe = self._probes.get(provider)
+        if probe is not None:
+            if not probe.done():
+                return False
+            del self._probes[provider]
+        cooldown = self._cooldowns.get(provider)
+        return cooldown is None or cooldown[0] <= now
+
     def get_now_playing(self) -> Optional[TrackInfo]:
+        now = time.monotonic()
+        futures: Dict[BaseProvider, Future] = {}
+        if self._pool is not None and self._active is not self._providers[0]:
+            # The top provider had nothing last time, so the ones below it
+            # will likely be asked too: run them alongside instead of after.
+            for provider in self._providers[1:]:
+                if self._due(provider, now):
+                    fut = self._pool.submit(provider.get_now_playing)
+                    futures[provider] = self._probes[provider] = fut
         for provider in self._providers:
-            try:
-                track = provider.get_now_playing()
-                if track is not None:
-                    self._active = provider
-                    return track
-            except Exception as e:
-                log.debug("Provider %s error: %s", provider.name, e)
-                continue
+            cooldown = self._cooldowns.get(provider)
+            fut = futures.get(provider)
+            if fut is None and not self._due(provider, now):
+                track = None
+            else:
+                try:
+                    if fut is not None:
+                        track = fut.result(timeout=self._PROBE_TIMEOUT)
+                    else:
+                        track = provider.get_now_playing()
+                except FutureTimeout:
+                    log.debug("Provider %s probe timed out", provider.name)
+                    track = None
+                except Exception as e:
+                    log.debug("Provider %s error: %s", provider.name, e)
+                    track = None
+                if track is None:
+                    delay = min(cooldown[1] * 2, self._BACKOFF_MAX) if cooldown else 1.0
+                    self._cooldowns[provider] = (now + delay, delay)
+            if track is not None:
+                self._cooldowns.pop(provider, None)
+                self._active = provider
+                self._misses = 0
+                self._last_track = (track, now)
+                return track
+            if provider is self._active:
+                self._misses += 1
+                if self._misses < self._GRACE_POLLS:
+                    return self._repeat_last(now)
         self._active = None
+        self._last_track = None
         return None
+
+    def _repeat_last(self, now: float) -> Optional[TrackInfo]:
+        if self._last_track is None:
+            return None
+        track, seen = self._last_track
+        if track.position_sec is None or not track.is_playing:
+            return track
+        return dataclasses.replace(track, position_sec=track.position_sec + int(now - seen))
+
+    def suggested_poll_delay(self) -> Optional[float]:
+        """The active provider's poll-delay hint, if any."""
+        active = self._active
+        if active is None:
+            return None
+        try:
+            return active.suggested_poll_delay()
+        except Exception as e:
+            log.debug("Provider %s poll hint error: %s", active.name, e)
+            return None
+
+    def subscribe(self, callback: Callable[[], None]) -> bool:
+        """Subscribe ``callback`` on every provider; ``True`` if none needs polling."""
+        def _on_change():
+            self._cooldowns.clear()
+            callback()
+
+        event_driven = True
+        for provider in self._providers:
+            try:
+                if not provider.subscribe(_on_change):
+                    event_driven = False
+            except Exception as e:
+                log.debug("Provider %s subscribe error: %s", provider.name, e)
+                event_driven = False
+        return event_driven
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+        for provider in self._providers:
+            try:
+                provider.close()
+            except Exception as e:
+                log.debug("Provider %s close error: %s", provider.name, e)
@@ -1,36 +1,165 @@
+import dataclasses
+import functools
 import hashlib
+import json
 import os
+import threading
 import time
-import urllib.parse
-from typing import Optional
+from concurrent.futures import Future
+from typing import Callable, Optional
 
 from logger import get_logger
 from providers.base import TrackInfo
-from utils import upload_cover_to_catbox
+from utils import (
+    DaemonExecutor, app_dir, downscale_cover, preconnect_catbox, quote_component,
+    upload_cover_to_catbox,
+)
 
 log = get_logger("erp.presence")
 
+# Hashing and uploading a new cover happens here so a slow catbox.moe
+# response never holds up the poll tick.
+_cover_pool = DaemonExecutor(max_workers=1, thread_name_prefix="erp-cover")
+
+
+# Fields that are the same in every activity we send.
+_PARTY_KW = {"party_id": "eternal-session-1", "party_size": [1, 2]}
+
+
+@functools.lru_cache(maxsize=128)
+def _quote(text: str) -> str:
+    # The join-secret loop re-quotes the same title/artist prefixes on every
+    # refresh of the same track.
+    return quote_component(text)
+
+
+# Content hash -> catbox URL, kept across runs so replaying a song (or
+# restarting) never uploads the same cover twice.  Dict order is recency
+# (hits move to the end), so trimming drops the least recently used covers.
+# The poll thread looks covers up, the cover worker adds uploads.
+_COVER_CACHE_MAX = 500
+_cover_cache: Optional[dict] = None
+_cover_cache_lock = threading.Lock()
+
+
+def _cover_cache_path() -> str:
+    return os.path.join(app_dir(), ".cover_cache.json")
+
+
+def _load_cover_cache() -> dict:
+    """The URL cache, read from disk on first use.  Call with the lock held."""
+    global _cover_cache
+    if _cover_cache is None:
+        _cover_cache = {}
+        try:
+            with open(_cover_cache_path(), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                _cover_cache = {k: v for k, v in data.items() if isinstance(v, str)}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log.debug("Cover cache unreadable, starting empty: %s", e)
+    return _cover_cache
+
+
+def _lookup_cover(thumb_hash: bytes) -> Optional[str]:
+    """URL already uploaded for ``thumb_hash``, marked most recently used."""
+    key = thumb_hash.hex()
+    with _cover_cache_lock:
+        cache = _load_cover_cache()
+        url = cache.pop(key, None)
+        if url:
+            cache[key] = url
+    return url
+
+
+def _store_cover(thumb_hash: bytes, url: str):
+    with _cover_cache_lock:
+        cache = _load_cover_cache()
+        cache[thumb_hash.hex()] = url
+        while len(cache) > _COVER_CACHE_MAX:
+            del cache[next(iter(cache))]
+        snapshot = dict(cache)
+    path = _cover_cache_path()
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, path)
+    except Exception as e:
+        log.debug("Cover cache save failed: %s", e)
+
+
+def _upload_cover(cover_art: bytes, thumb_hash: bytes) -> Optional[str]:
+    url = upload_cover_to_catbox(downscale_cover(cover_art))
+    if url:
+        log.debug("Cover art uploaded: %s", url)
+        _store_cover(thumb_hash, url)
+    else:
+        log.warning("Cover art upload failed (hash %s)", thumb_hash[:4].hex())
+    return url
+
 
 class DiscordPresence:
     """Manages the Discord Rich Presence connection and per-track updates."""
 
-    def __init__(self, client_id: str, asset_key: str = "apple_music"):
+    def __init__(self, client_id: str, asset_key: str = "apple_music",
+                 on_cover_ready: Optional[Callable[[], None]] = None):
         self._client_id = client_id
         self._asset_key = asset_key
+        # Called from the cover worker once an upload finishes, so the
+        # caller can run update() again without waiting for its next tick.
+        self._on_cover_ready = on_cover_ready
         self._rpc = None
         self._last_track_key: Optional[str] = None
-        self._last_cover_hash: Optional[str] = None
+        self._last_cover_fp: Optional[tuple] = None
         self._last_cover_url_sent: Optional[str] = None
         self._cached_cover_url: Optional[str] = None
+        self._pending_cover: Optional[Future] = None
         self._last_update_time: float = 0.0
         self._locked_start: Optional[int] = None
+        self._activity_shown = False
+        self._last_update_kw: Optional[dict] = None
+        self._last_sent_at: float = 0.0
+        self._deferred = False
+        self._connect_next_try = 0.0
+        self._connect_backoff = self._CONNECT_BACKOFF_MIN
+        self._join_key: Optional[tuple] = None
+        self._join_cached = ""
+        self._catbox_warmed = False
         self.current_track: Optional[TrackInfo] = None
 
+    # Discord not running: retry after 5 s, 10 s, 20 s ... up to 2 minutes.
+    _CONNECT_BACKOFF_MIN = 5.0
+    _CONNECT_BACKOFF_MAX = 120.0
+
+    def connect_due_in(self) -> float:
+        """Seconds until the next automatic connect attempt is due (0 = now)."""
+        return max(0.0, self._connect_next_try - time.monotonic())
+
     def connect(self):
         from pypresence import Presence
-        self._rpc = Presence(self._client_id)
-        self._rpc.connect()
+        rpc = Presence(self._client_id)
+        try:
+            rpc.connect()
+        except Exception:
+            self._connect_next_try = time.monotonic() + self._connect_backoff
+            self._connect_backoff = min(self._connect_backoff * 2, self._CONNECT_BACKOFF_MAX)
+            raise
+        self._connect_next_try = 0.0
+        self._connect_backoff = self._CONNECT_BACKOFF_MIN
+        # Only keep the client once the handshake succeeded, so a failed
+        # attempt leaves _rpc as None and the poll loop retries.
+        self._rpc = rpc
+        self._activity_shown = False
+        self._last_update_kw = None
+        self._deferred = False
         log.debug("RPC handshake complete")
+        if not self._catbox_warmed:
+            # A cover upload usually follows right after the first connect.
+            self._catbox_warmed = True
+            _cover_pool.submit(preconnect_catbox)
 
     def disconnect(self):
         if self._rpc is None:
@@ -46,6 +175,15 @@ class DiscordPresence:
 
     _REFRESH_INTERVAL = 30
     _SEEK_THRESHOLD = 5
+    # Seeks and refreshes within this many seconds of the last send are
+    # coalesced into one later send.  Track and cover changes go out at once.
+    _MIN_SEND_INTERVAL = 15
+
+    def flush_due_in(self) -> Optional[float]:
+        """Seconds until a coalesced update may be sent, or ``None`` if none is waiting."""
+        if not self._deferred:
+            return None
+        return max(0.0, self._last_sent_at + self._MIN_SEND_INTERVAL - time.time())
 
     def update(self, track: TrackInfo, provider_name: str = ""):
         if self._rpc is None:
@@ -59,7 +197,10 @@ class DiscordPresence:
         details = title
 
         track_key = f"{details}|{state}"
-        self.current_track = track
+        # Only the tray reads current_track, and never the cover bytes.
+        self.current_track = (
+            dataclasses.replace(track, cover_art=None) if track.cover_art else track
+        )
 
         now = time.time()
         pos = int(track.position_sec) if track.position_sec is not None else 0
@@ -79,35 +220,15 @@ class DiscordPresence:
         cover_changed = cover_url != self._last_cover_url_sent
         stale = (now - self._last_update_time) >= self._REFRESH_INTERVAL
 
-        if not (track_changed or seeked or cover_changed or stale):
+        if not (track_changed or seeked or cover_changed or stale or self._deferred):
             return
 
-        max_track = min(len(details), 80)
-        max_artist = min(len(artist), 40)
-        while max_track > 10 or max_artist > 10:
-            safe_track = urllib.parse.quote(details[:max_track], safe="")
-            safe_artist = urllib.parse.quote(artist[:max_artist], safe="")
-            join_secret = f"eternalrp://sync?track={safe_track}&artist={safe_artist}&pos={pos}"
-            if len(join_secret) <= 128:
-                break
-            if max_track > max_artist and max_track > 10:
-                max_track -= 5
-            elif max_artist > 10:
-                max_artist -= 5
-            else:
-                max_track -= 5
-        else:
-            safe_track = urllib.parse.quote(details[:max_track], safe="")
-            safe_artist = urllib.parse.quote(artist[:max_artist], safe="")
-            join_secret = f"eternalrp://sync?track={safe_track}&artist={safe_artist}&pos={pos}"
-        if len(join_secret) > 128:
-            join_secret = join_secret[:128]
+        join_secret = self._join_secret(details, artist, pos)
 
         update_kw = dict(
+            _PARTY_KW,
             state=state,
             details=details,
-            party_id="eternal-session-1",
-            party_size=[1, 2],
             join=join_secret,
             start=self._locked_start,
         )
@@ -121,33 +242,129 @@ class DiscordPresence:
 
         self._last_cover_url_sent = cover_url
         self._last_update_time = now
+        # A periodic refresh while paused rebuilds exactly what Discord
+        # already shows; don't send it again.
+        if self._activity_shown and update_kw == self._last_update_kw:
+            self._deferred = False
+            return
+        if (not (track_changed or cover_changed)
+                and now - self._last_sent_at < self._MIN_SEND_INTERVAL):
+            # The next update() after the window carries the latest state.
+            self._deferred = True
+            return
         try:
             self._rpc.update(**update_kw)
         except Exception as e:
             log.error("Discord RPC update failed: %s (track=%s)", e, details, exc_info=True)
             return
+        self._activity_shown = True
+        self._last_update_kw = update_kw
+        self._last_sent_at = now
+        self._deferred = False
+
+    def _join_secret(self, details: str, artist: str, pos: int) -> str:
+        """Build the <=128-char sync URI, reused while (title, artist, pos // 5) holds.
+
+        The bucket matches _SEEK_THRESHOLD, so a listener joins at most a
+        few seconds off, same as the tray's copied link.
+        """
+        key = (details, artist, pos // 5)
+        if key == self._join_key:
+            return self._join_cached
+        max_track = min(len(details), 80)
+        max_artist = min(len(artist), 40)
+        while max_track > 10 or max_artist > 10:
+            safe_track = _quote(details[:max_track])
+            safe_artist = _quote(artist[:max_artist])
+            join_secret = f"eternalrp://sync?track={safe_track}&artist={safe_artist}&pos={pos}"
+            if len(join_secret) <= 128:
+                break
+            if max_track > max_artist and max_track > 10:
+                max_track -= 5
+            elif max_artist > 10:
+                max_artist -= 5
+            else:
+                max_track -= 5
+        else:
+            safe_track = _quote(details[:max_track])
+            safe_artist = _quote(artist[:max_artist])
+            join_secret = f"eternalrp://sync?track={safe_track}&artist={safe_artist}&pos={pos}"
+        if len(join_secret) > 128:
+            join_secret = join_secret[:128]
+        self._join_key, self._join_cached = key, join_secret
+        return join_secret
 
     def clear(self):
         if self._rpc is None:
             return
+        self._last_track_key = None
+        self._locked_start = None
+        self._deferred = False
+        # The idle poll calls clear() every tick; only the first one needs
+        # to reach Discord.
+        if not self._activity_shown:
+            return
         try:
             self._rpc.clear(pid=os.getpid())
         except Exception as e:
             log.debug("RPC clear failed: %s", e)
-        self._last_track_key = None
-        self._locked_start = None
+            return
+        self._activity_shown = False
+        self._last_update_kw = None
+
+    _COVER_FP_EDGE = 4096
 
     def _resolve_cover(self, cover_art: Optional[bytes]) -> Optional[str]:
+        """Return the public URL for ``cover_art``, or ``None`` while it is unknown.
+
+        A new cover is hashed and looked up in the URL cache right away; only
+        an upload runs in the background.  Until that finishes the caller
+        falls back to the static asset key and picks up the URL on the next
+        update() (prompted by ``on_cover_ready``).
+        """
         if not cover_art:
-            self._last_cover_hash = None
+            self._last_cover_fp = None
             self._cached_cover_url = None
+            self._cancel_pending_cover()
             return None
-        thumb_hash = hashlib.sha1(cover_art).hexdigest()
-        if thumb_hash != self._last_cover_hash:
-            self._last_cover_hash = thumb_hash
-            self._cached_cover_url = upload_cover_to_catbox(cover_art)
+        # Same length, head and tail almost always means the same image; skip
+        # the full hash in the steady-state "same track, same cover" case.
+        # The head alone is mostly JPEG/EXIF header shared between covers,
+        # the tail is entropy-coded pixel data.
+        edge = self._COVER_FP_EDGE
+        fp = (len(cover_art), hash(cover_art[:edge]), hash(cover_art[-edge:]))
+        if fp != self._last_cover_fp:
+            self._last_cover_fp = fp
+            # Skipping through tracks shouldn't queue an upload per track;
+            # only the newest cover is still wanted.
+            self._cancel_pending_cover()
+            thumb_hash = hashlib.blake2b(cover_art, digest_size=16).digest()
+            self._cached_cover_url = _lookup_cover(thumb_hash)
             if self._cached_cover_url:
-                log.debug("Cover art uploaded: %s", self._cached_cover_url)
-            else:
-                log.warning("Cover art upload failed (hash %s)", thumb_hash[:8])
+                log.debug("Cover art already uploaded: %s", self._cached_cover_url)
+                return self._cached_cover_url
+            fut = _cover_pool.submit(_upload_cover, cover_art, thumb_hash)
+            if self._on_cover_ready is not None:
+                fut.add_done_callback(self._cover_done)
+            self._pending_cover = fut
+        fut = self._pending_cover
+        if fut is not None and fut.done():
+            self._pending_cover = None
+            try:
+                self._cached_cover_url = fut.result()
+            except Exception as e:
+                log.warning("Cover art upload error: %s", e)
         return self._cached_cover_url
+
+    def _cancel_pending_cover(self):
+        if self._pending_cover is not None:
+            self._pending_cover.cancel()
+            self._pending_cover = None
+
+    def _cover_done(self, fut: Future):
+        if fut.cancelled():
+            return
+        try:
+            self._on_cover_ready()
+        except Exception as e:
+            log.debug("on_cover_ready callback failed: %s", e)
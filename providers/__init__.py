@@ -1,5 +1,20 @@
 from .base import BaseProvider, TrackInfo
-from .apple_music import AppleMusicProvider
-from .spotify import SpotifyProvider
 
 __all__ = ["BaseProvider", "TrackInfo", "AppleMusicProvider", "SpotifyProvider"]
+
+# The concrete providers are loaded on first access, so importing
+# providers.base (presence, manager) doesn't drag in COM/WinRT setup.
+_LAZY = {
+    "AppleMusicProvider": ".apple_music",
+    "SpotifyProvider": ".spotify",
+}
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
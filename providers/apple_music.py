@@ -1,8 +1,10 @@
 import asyncio
+import concurrent.futures
+import dataclasses
 import sys
 import threading
 import time
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
 
 from logger import get_logger
 from .base import BaseProvider, TrackInfo
@@ -11,9 +13,11 @@ log = get_logger("erp.apple_music")
 
 # winrt on Python 3.13 fires "Event loop is closed" from a native callback
 # after asyncio.run() has already returned the data.  Suppress via every
-# hook Python exposes for unhandled/unraisable exceptions.
-_orig_threading_hook = threading.excepthook
-_orig_unraisable_hook = sys.unraisablehook
+# hook Python exposes for unhandled/unraisable exceptions.  Our hooks carry
+# the ones they wrap, so re-importing this module replaces them rather than
+# stacking another layer on top.
+_orig_threading_hook = getattr(threading.excepthook, "_erp_wrapped", threading.excepthook)
+_orig_unraisable_hook = getattr(sys.unraisablehook, "_erp_wrapped", sys.unraisablehook)
 
 
 def _quiet_threading_hook(args):
@@ -28,10 +32,25 @@ def _quiet_unraisable_hook(unraisable):
     _orig_unraisable_hook(unraisable)
 
 
+_quiet_threading_hook._erp_wrapped = _orig_threading_hook
+_quiet_unraisable_hook._erp_wrapped = _orig_unraisable_hook
 threading.excepthook = _quiet_threading_hook
 sys.unraisablehook = _quiet_unraisable_hook
 
 
+# Resolved once at import; None when the winrt packages aren't installed.
+try:
+    from winrt.windows.media.control import (
+        GlobalSystemMediaTransportControlsSessionManager as _MediaManager,
+    )
+except ImportError:
+    _MediaManager = None
+try:
+    from winrt.windows.storage.streams import Buffer, DataReader, InputStreamOptions
+except ImportError:
+    Buffer = DataReader = InputStreamOptions = None
+
+_THUMB_MAX_BYTES = 2 * 1024 * 1024
 _WIN_EPOCH_OFFSET = 116444736000000000  # 100ns ticks between 1601-01-01 and 1970-01-01
 
 
@@ -62,9 +81,41 @@ class AppleMusicProvider(BaseProvider):
     or Windows SMTC (modern Apple Music / any system player).
     """
 
+    _SMTC_TIMEOUT = 15
+    # Per-call bounds inside a fetch, so one hung WinRT call fails that fetch
+    # quickly instead of running into _SMTC_TIMEOUT.
+    _MANAGER_TIMEOUT = 5
+    _PROPS_TIMEOUT = 3
+    # While subscribed, a cached result is trusted for at most this long
+    # without a change event before SMTC is read again.
+    _CACHE_MAX_AGE = 30
+
     def __init__(self):
         self._itunes = None
+        self._itunes_track_id = None
+        self._itunes_meta: Tuple[str, str, str, Optional[int]] = (
+            "Unknown", "Unknown Artist", "", None
+        )
         self._use_smtc = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._media_manager = None
+        self._on_change: Optional[Callable[[], None]] = None
+        self._manager_token = None
+        self._session_tokens: List[Tuple[Callable, object]] = []
+        # Current SMTC session while subscribed; kept fresh by the
+        # session-changed event, so _fetch needn't look it up each time.
+        self._session = None
+        self._subscribed = False
+        self._dirty = True
+        self._cached: Optional[TrackInfo] = None
+        self._cached_at = 0.0
+        # Last SMTC read and its (title, artist, album); while the track and
+        # its cover are unchanged only the timeline is refreshed.
+        self._last_key: Optional[tuple] = None
+        self._last_track: Optional[TrackInfo] = None
+        # WinRT read buffer reused across thumbnail reads (grown on demand).
+        self._thumb_buf = None
         self._init_source()
 
     @property
@@ -82,6 +133,181 @@ class AppleMusicProvider(BaseProvider):
             self._use_smtc = True
             log.debug("iTunes COM unavailable (%s), using SMTC", e)
 
+    def close(self):
+        """Drop SMTC event handlers and stop the background event loop."""
+        self._on_change = None
+        self._subscribed = False
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            loop.call_soon_threadsafe(self._unsubscribe_smtc)
+            loop.call_soon_threadsafe(loop.stop)
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Start (once) the long-lived event loop that every SMTC fetch runs on."""
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, daemon=True, name="smtc-loop"
+                ).start()
+                self._loop = loop
+            return self._loop
+
+    def subscribe(self, callback: Callable[[], None]) -> bool:
+        """Wake ``callback`` whenever the player reports a change.
+
+        SMTC: media, playback, timeline and session changes.  iTunes COM:
+        play, stop, track-changed and quit events.
+        """
+        if self._itunes is not None:
+            self._on_change = callback
+            return self._subscribe_itunes()
+        if _MediaManager is None:
+            return False
+        self._on_change = callback
+        fut = asyncio.run_coroutine_threadsafe(self._subscribe_smtc(), self._ensure_loop())
+        try:
+            return fut.result(timeout=self._SMTC_TIMEOUT)
+        except Exception as e:
+            fut.cancel()
+            log.debug("SMTC subscribe failed, falling back to polling: %s", e)
+            return False
+
+    def _subscribe_itunes(self) -> bool:
+        """Receive iTunes player events on a dedicated COM thread.
+
+        COM delivers events through the window-message queue of the thread
+        that connected, so that thread has to pump messages; the poll thread
+        only ever sleeps on an Event and can't.
+        """
+        try:
+            import pythoncom
+            import win32com.client
+            import win32event
+        except ImportError:
+            return False
+
+        provider = self
+        ready = threading.Event()
+        connected = []
+
+        class _Events:
+            def OnPlayerPlayEvent(self, _track):
+                provider._notify()
+
+            def OnPlayerStopEvent(self, _track):
+                provider._notify()
+
+            def OnPlayerPlayingTrackChangedEvent(self, _track):
+                provider._notify()
+
+            def OnQuittingEvent(self):
+                provider._notify()
+
+        def _pump():
+            pythoncom.CoInitialize()
+            try:
+                try:
+                    app = win32com.client.DispatchWithEvents("iTunes.Application", _Events)
+                except Exception as e:
+                    log.debug("iTunes DispatchWithEvents failed: %s", e)
+                    ready.set()
+                    return
+                connected.append(True)
+                ready.set()
+                while self._on_change is not None:
+                    win32event.MsgWaitForMultipleObjects(
+                        [], False, 500, win32event.QS_ALLINPUT
+                    )
+                    pythoncom.PumpWaitingMessages()
+                del app
+            finally:
+                pythoncom.CoUninitialize()
+
+        threading.Thread(target=_pump, daemon=True, name="itunes-events").start()
+        ready.wait(self._SMTC_TIMEOUT)
+        if connected:
+            log.debug("Subscribed to iTunes player events")
+        return bool(connected)
+
+    async def _get_media_manager(self):
+        if self._media_manager is None:
+            self._media_manager = await asyncio.wait_for(
+                _MediaManager.request_async(), timeout=self._MANAGER_TIMEOUT
+            )
+        return self._media_manager
+
+    async def _subscribe_smtc(self) -> bool:
+        manager = await self._get_media_manager()
+        if self._manager_token is None:
+            self._manager_token = manager.add_current_session_changed(self._on_session_changed)
+        self._hook_session(manager.get_current_session())
+        self._subscribed = True
+        log.debug("Subscribed to SMTC change events")
+        return True
+
+    def _notify(self, *_args):
+        self._dirty = True
+        cb = self._on_change
+        if cb is None:
+            return
+        try:
+            cb()
+        except Exception as e:
+            log.debug("SMTC change callback: %s", e)
+
+    def _on_session_changed(self, *_args):
+        # Fired on a WinRT thread; re-hook on the loop that owns the manager.
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._rehook_session)
+        self._notify()
+
+    def _rehook_session(self):
+        manager = self._media_manager
+        if manager is None:
+            return
+        try:
+            self._hook_session(manager.get_current_session())
+        except Exception as e:
+            log.debug("SMTC session re-hook: %s", e)
+
+    def _hook_session(self, session):
+        """Move the per-session change handlers over to ``session``."""
+        self._unhook_session()
+        self._session = session
+        if session is None:
+            return
+        for add, remove in (
+            (session.add_media_properties_changed, session.remove_media_properties_changed),
+            (session.add_playback_info_changed, session.remove_playback_info_changed),
+            (session.add_timeline_properties_changed, session.remove_timeline_properties_changed),
+        ):
+            try:
+                self._session_tokens.append((remove, add(self._notify)))
+            except Exception as e:
+                log.debug("SMTC session subscribe: %s", e)
+
+    def _unhook_session(self):
+        tokens, self._session_tokens = self._session_tokens, []
+        for remove, token in tokens:
+            try:
+                remove(token)
+            except Exception as e:
+                log.debug("SMTC session unsubscribe: %s", e)
+
+    def _unsubscribe_smtc(self):
+        self._unhook_session()
+        self._session = None
+        manager, self._media_manager = self._media_manager, None
+        token, self._manager_token = self._manager_token, None
+        if manager is not None and token is not None:
+            try:
+                manager.remove_current_session_changed(token)
+            except Exception as e:
+                log.debug("SMTC manager unsubscribe: %s", e)
+
     def is_available(self) -> bool:
         if self._itunes is not None:
             try:
@@ -95,35 +321,59 @@ class AppleMusicProvider(BaseProvider):
     def get_now_playing(self) -> Optional[TrackInfo]:
         if self._itunes is not None:
             return self._poll_itunes()
-        return self._poll_smtc()
+        age = time.monotonic() - self._cached_at
+        if self._subscribed and not self._dirty and age < self._CACHE_MAX_AGE:
+            return self._extrapolate(self._cached, age)
+        # Cleared before the fetch so an event that lands mid-fetch is kept.
+        self._dirty = False
+        track = self._poll_smtc()
+        self._cached, self._cached_at = track, time.monotonic()
+        return track
+
+    @staticmethod
+    def _extrapolate(track: Optional[TrackInfo], age: float) -> Optional[TrackInfo]:
+        """Advance a cached track's position by the time since it was read."""
+        if track is None or track.position_sec is None:
+            return track
+        return dataclasses.replace(track, position_sec=track.position_sec + int(age))
 
     def _poll_itunes(self) -> Optional[TrackInfo]:
         try:
-            track = self._itunes.CurrentTrack
+            itunes = self._itunes
+            track = itunes.CurrentTrack
             if track is None:
                 return None
+            # Every property read is an out-of-process COM call; the metadata
+            # only needs re-reading when iTunes moves to a different track.
+            track_id = getattr(track, "TrackDatabaseID", None)
+            if track_id is None or track_id != self._itunes_track_id:
+                self._itunes_meta = (
+                    getattr(track, "Name", None) or "Unknown",
+                    getattr(track, "Artist", None) or "Unknown Artist",
+                    getattr(track, "Album", None) or "",
+                    getattr(track, "Duration", None) or None,
+                )
+                self._itunes_track_id = track_id
+            title, artist, album, duration = self._itunes_meta
             return TrackInfo(
-                title=getattr(track, "Name", None) or "Unknown",
-                artist=getattr(track, "Artist", None) or "Unknown Artist",
-                album=getattr(track, "Album", None) or "",
-                position_sec=getattr(self._itunes, "PlayerPosition", 0) or 0,
+                title=title,
+                artist=artist,
+                album=album,
+                position_sec=getattr(itunes, "PlayerPosition", 0) or 0,
+                duration_sec=duration,
             )
         except Exception as e:
             log.debug("iTunes _poll_itunes: %s", e)
             return None
 
     def _poll_smtc(self) -> Optional[TrackInfo]:
-        try:
-            from winrt.windows.media.control import (
-                GlobalSystemMediaTransportControlsSessionManager as MediaManager,
-            )
-        except ImportError:
+        if _MediaManager is None:
             return None
 
         async def _fetch():
             try:
-                manager = await MediaManager.request_async()
-                session = manager.get_current_session()
+                manager = await self._get_media_manager()
+                session = self._session if self._subscribed else manager.get_current_session()
                 sessions = [session] if session else []
                 if not sessions:
                     try:
@@ -133,11 +383,21 @@ class AppleMusicProvider(BaseProvider):
                     except Exception as e:
                         log.debug("SMTC get_sessions: %s", e)
 
-                for s in sessions:
-                    if s is None:
+                sessions = [s for s in sessions if s is not None]
+                # Ask every session at once; only the first with properties
+                # goes on to the timeline and thumbnail reads.
+                all_props = await asyncio.gather(
+                    *(
+                        asyncio.wait_for(s.try_get_media_properties_async(), self._PROPS_TIMEOUT)
+                        for s in sessions
+                    ),
+                    return_exceptions=True,
+                )
+                for s, props in zip(sessions, all_props):
+                    if isinstance(props, BaseException):
+                        log.debug("SMTC media properties: %s", props)
                         continue
                     try:
-                        props = await s.try_get_media_properties_async()
                         if not props:
                             continue
 
@@ -146,6 +406,7 @@ class AppleMusicProvider(BaseProvider):
                         album = (getattr(props, "album_title", "") or "").strip()
 
                         pos_sec = None
+                        duration_sec = None
                         try:
                             timeline = s.get_timeline_properties()
                             if timeline:
@@ -154,18 +415,32 @@ class AppleMusicProvider(BaseProvider):
                                     raw_sec = pos.total_seconds()
                                     elapsed = _smtc_elapsed_since_update(timeline)
                                     pos_sec = int(raw_sec + elapsed)
+                                end = getattr(timeline, "end_time", None)
+                                if end is not None and hasattr(end, "total_seconds"):
+                                    duration_sec = int(end.total_seconds()) or None
                         except Exception as e:
                             log.debug("SMTC timeline/position: %s", e)
 
-                        thumbnail_bytes = await self._read_thumbnail(props)
-
-                        return TrackInfo(
+                        # The cover only changes with the track; players often
+                        # publish it a moment after the title, so keep retrying
+                        # until one arrives.
+                        key = (title, artist, album)
+                        last = self._last_track
+                        if key == self._last_key and last is not None and last.cover_art is not None:
+                            return dataclasses.replace(
+                                last, position_sec=pos_sec, duration_sec=duration_sec
+                            )
+
+                        track = TrackInfo(
                             title=title,
                             artist=artist,
                             album=album,
                             position_sec=pos_sec,
-                            cover_art=thumbnail_bytes,
+                            duration_sec=duration_sec,
+                            cover_art=await self._read_thumbnail(props),
                         )
+                        self._last_key, self._last_track = key, track
+                        return track
                     except Exception as e:
                         log.debug("SMTC session props: %s", e)
                         continue
@@ -174,37 +449,52 @@ class AppleMusicProvider(BaseProvider):
                 log.debug("SMTC _fetch: %s", e)
                 return None
 
-        result = [None]
-
-        def _run_in_thread():
-            try:
-                result[0] = asyncio.run(_fetch())
-            except Exception as e:
-                log.debug("SMTC fetch error: %s", e)
-
-        t = threading.Thread(target=_run_in_thread, daemon=True)
-        t.start()
-        t.join(timeout=15)
-        return result[0]
+        fut = asyncio.run_coroutine_threadsafe(_fetch(), self._ensure_loop())
+        try:
+            return fut.result(timeout=self._SMTC_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            fut.cancel()
+            log.debug("SMTC fetch timed out after %ds", self._SMTC_TIMEOUT)
+        except Exception as e:
+            log.debug("SMTC fetch error: %s", e)
+        return None
 
-    @staticmethod
-    async def _read_thumbnail(props) -> Optional[bytes]:
+    async def _read_thumbnail(self, props) -> Optional[bytes]:
         """Read cover art with a short timeout; returns None on any failure."""
         try:
             thumb_ref = getattr(props, "thumbnail", None)
-            if thumb_ref is None:
+            if thumb_ref is None or Buffer is None:
                 return None
 
             async def _do_read():
-                from winrt.windows.storage.streams import Buffer, InputStreamOptions
                 stream = await thumb_ref.open_read_async()
-                buf = Buffer(2 * 1024 * 1024)
-                await stream.read_async(buf, buf.capacity, InputStreamOptions.READ_AHEAD)
+                # Size the buffer to the image rather than always 2 MB; covers
+                # are usually a few hundred KB.
+                size = int(getattr(stream, "size", 0) or 0)
+                if not 0 < size <= _THUMB_MAX_BYTES:
+                    size = _THUMB_MAX_BYTES
+                buf = self._thumb_buf
+                if buf is None or buf.capacity < size:
+                    buf = self._thumb_buf = Buffer(size)
+                buf.length = 0
+                result = await stream.read_async(buf, size, InputStreamOptions.NONE)
+                if result is not None:
+                    buf = result
                 n = getattr(buf, "length", buf.capacity)
-                return bytes(bytearray(buf)[:n])
+                try:
+                    # winrt buffers expose the buffer protocol: one copy out.
+                    return bytes(memoryview(buf)[:n])
+                except TypeError:
+                    # No buffer protocol here, so neither does read_buffer's
+                    # result: have the reader fill a bytearray instead.
+                    data = bytearray(n)
+                    DataReader.from_buffer(buf).read_bytes(data)
+                    return bytes(data)
 
             return await asyncio.wait_for(_do_read(), timeout=3)
         except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            # The abandoned read may still write into the pooled buffer.
+            self._thumb_buf = None
             log.debug("Thumbnail read timeout/cancel: %s", e)
             return None
         except Exception as e:
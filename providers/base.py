@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Optional
+from typing import Callable, Optional
 
 
 @dataclass
@@ -10,6 +10,7 @@ class TrackInfo:
     artist: str = "Unknown Artist"
     album: str = ""
     position_sec: Optional[int] = None
+    duration_sec: Optional[int] = None
     cover_art: Optional[bytes] = None
     is_playing: bool = True
 
@@ -29,3 +30,22 @@ class BaseProvider(ABC):
     @abstractmethod
     def get_now_playing(self) -> Optional[TrackInfo]:
         ...
+
+    def close(self):
+        """Release background resources.  Optional; the default is a no-op."""
+
+    def subscribe(self, callback: Callable[[], None]) -> bool:
+        """Arrange for ``callback`` to be called when the now-playing state changes.
+
+        Returns ``True`` if the provider will push changes, ``False`` if it has
+        to be polled (the default).
+        """
+        return False
+
+    def suggested_poll_delay(self) -> Optional[float]:
+        """Seconds the caller may wait before polling again, or ``None`` for no hint.
+
+        Lets a provider that can tell playback has gone quiet (e.g. paused
+        for a while) ask to be polled less often.
+        """
+        return None
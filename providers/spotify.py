@@ -1,14 +1,45 @@
+import dataclasses
+import functools
 import os
+import random
 import re
 import sys
-import urllib.request
-from typing import Optional
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional, Tuple
 
 from logger import get_logger
+from utils import DaemonExecutor
 from .base import BaseProvider, TrackInfo
 
 log = get_logger("erp.spotify")
 
+try:
+    import spotipy
+    from spotipy.oauth2 import SpotifyOAuth
+except ImportError:
+    spotipy = SpotifyOAuth = None
+
+# Noise stripped from titles before fuzzy-matching search results.
+_STRIP_SUFFIXES = re.compile(
+    r"\s*[\-–—]\s*(single|deluxe|remaster(ed)?(\s*\d{4})?|bonus\s*track|"
+    r"expanded|anniversary|live|remix|version|edition|"
+    r"explicit|clean|mono|stereo|radio\s*edit|acoustic|"
+    r"original\s*mix|extended|instrumental|interlude|skit)"
+    r".*$",
+    re.IGNORECASE,
+)
+_PAREN_NOISE = re.compile(
+    r"\s*[\(\[](?:remaster(ed)?(\s*\d{4})?|deluxe(\s*edition)?|"
+    r"single|bonus|expanded|anniversary(\s*edition)?|"
+    r"live|remix|feat\.?[^)\]]*|ft\.?[^)\]]*|with\s+[^)\]]*|"
+    r"version|edition|explicit|clean|mono|stereo|"
+    r"radio\s*edit|acoustic|original\s*mix|extended|"
+    r"instrumental|from\s+[^)\]]*|prod\.?\s*[^)\]]*)[^)\]]*[\)\]]",
+    re.IGNORECASE,
+)
+
 
 def _app_dir() -> str:
     if getattr(sys, "frozen", False):
@@ -24,6 +55,15 @@ class SpotifyProvider(BaseProvider):
 
     SCOPES = "user-read-currently-playing user-read-playback-state user-modify-playback-state"
     LATENCY_OFFSET_MS = 1500
+    # Poll delays while paused: soon after pausing, then once it's been a while.
+    _PAUSED_POLL = 15.0
+    _LONG_PAUSED_POLL = 60.0
+    _LONG_PAUSE_AFTER = 300.0
+    # Used when a 429 carries no usable Retry-After header.
+    _DEFAULT_RETRY_AFTER = 30
+    # Album id -> cover bytes, so flipping between a few albums doesn't
+    # re-download art.  Covers run to a few hundred KB, hence the small cap.
+    _COVER_CACHE_MAX = 16
 
     def __init__(self, client_id: str, client_secret: str,
                  redirect_uri: str = "http://localhost:8888/callback"):
@@ -33,6 +73,20 @@ class SpotifyProvider(BaseProvider):
         self._sp = None
         self._last_album_id: Optional[str] = None
         self._cached_cover: Optional[bytes] = None
+        self._covers: "OrderedDict[str, bytes]" = OrderedDict()
+        # One keep-alive session for the Web API and cover downloads.
+        self._http = None
+        # Covers download on this worker so a slow CDN never holds up the
+        # poll; the track goes out with the static asset until it lands.
+        self._cover_pool = DaemonExecutor(max_workers=1, thread_name_prefix="erp-spotify-cover")
+        self._pending_cover: Optional[Tuple[str, Future]] = None
+        # (track id, is_playing) from the last poll and when it last changed.
+        self._last_state: Optional[tuple] = None
+        # TrackInfo for _last_state; reused while only the position moves.
+        self._last_track: Optional[TrackInfo] = None
+        self._last_change = time.monotonic()
+        # monotonic deadline set by an HTTP 429; no API calls before it.
+        self._retry_after_until = 0.0
         self.last_error: Optional[str] = None
         self._init_client()
 
@@ -40,15 +94,42 @@ class SpotifyProvider(BaseProvider):
     def name(self) -> str:
         return "Spotify"
 
+    @staticmethod
+    def _make_session():
+        """A pooled requests session with spotipy's default retry policy.
+
+        spotipy only installs its Retry adapter on sessions it builds itself,
+        so an injected session has to carry the same policy.
+
+        The cover worker shares this session with spotipy. That is safe
+        because spotipy passes its auth headers per request and never
+        changes the session itself. The only shared state is the adapter's
+        urllib3 pool, which is thread-safe.
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        retry = Retry(
+            total=3, connect=None, read=False, status=3, backoff_factor=0.3,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
     def _token_cache_path(self) -> str:
         return os.path.join(_app_dir(), ".spotify_token_cache")
 
     def _init_client(self):
         if not self._client_id or not self._client_secret:
             return
+        if spotipy is None:
+            log.warning("Spotify init failed: spotipy is not installed")
+            return
         try:
-            import spotipy
-            from spotipy.oauth2 import SpotifyOAuth
             auth = SpotifyOAuth(
                 client_id=self._client_id,
                 client_secret=self._client_secret,
@@ -57,17 +138,43 @@ class SpotifyProvider(BaseProvider):
                 cache_path=self._token_cache_path(),
                 open_browser=True,
             )
-            self._sp = spotipy.Spotify(auth_manager=auth)
+            self._http = self._make_session()
+            self._sp = spotipy.Spotify(auth_manager=auth, requests_session=self._http)
             log.debug("Spotify client initialized")
         except Exception as e:
             self._sp = None
             log.warning("Spotify init failed: %s", e)
 
+    def _rate_limited(self) -> bool:
+        return time.monotonic() < self._retry_after_until
+
+    def _call(self, fn, *args, **kwargs):
+        """Run a spotipy call; ``None`` without a request while rate-limited.
+
+        429 is left out of the session's retry list, so a rate limit reaches
+        us with its real headers: honour Retry-After (plus jitter) and
+        re-raise for the caller's usual error handling.
+        """
+        if self._rate_limited():
+            return None
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if getattr(e, "http_status", None) == 429:
+                headers = getattr(e, "headers", None) or {}
+                try:
+                    retry = int(headers.get("Retry-After", self._DEFAULT_RETRY_AFTER))
+                except (TypeError, ValueError):
+                    retry = self._DEFAULT_RETRY_AFTER
+                self._retry_after_until = time.monotonic() + retry + random.uniform(0, 1)
+                log.warning("Spotify rate limit hit; pausing API calls for %ds", retry)
+            raise
+
     def is_available(self) -> bool:
         if self._sp is None:
             return False
         try:
-            current = self._sp.current_playback()
+            current = self._call(self._sp.current_playback)
             return current is not None and current.get("is_playing", False)
         except Exception as e:
             log.debug("Spotify is_available: %s", e)
@@ -77,7 +184,7 @@ class SpotifyProvider(BaseProvider):
         if self._sp is None:
             return None
         try:
-            current = self._sp.currently_playing()
+            current = self._call(self._sp.currently_playing)
             if not current or not current.get("item"):
                 return None
 
@@ -91,40 +198,98 @@ class SpotifyProvider(BaseProvider):
 
             progress_ms = current.get("progress_ms", 0) or 0
             pos_sec = progress_ms // 1000
+            duration_ms = item.get("duration_ms") or 0
 
             cover_art = self._fetch_cover(album_info)
             is_playing = current.get("is_playing", True)
-
-            return TrackInfo(
+            # Local files have no id; tell them apart by their tags instead.
+            state = (item.get("id") or (title, artist, album), is_playing)
+            last = self._last_track
+            if state == self._last_state and last is not None and last.cover_art is cover_art:
+                return dataclasses.replace(last, position_sec=pos_sec)
+            if state != self._last_state:
+                self._last_state = state
+                self._last_change = time.monotonic()
+
+            self._last_track = TrackInfo(
                 title=title,
                 artist=artist,
                 album=album,
                 position_sec=pos_sec,
+                duration_sec=duration_ms // 1000 or None,
                 cover_art=cover_art,
                 is_playing=is_playing,
             )
+            return self._last_track
         except Exception as e:
             log.debug("Spotify get_now_playing: %s", e)
             return None
 
+    def suggested_poll_delay(self) -> Optional[float]:
+        if self._last_state is None or self._last_state[1]:
+            return None
+        paused_for = time.monotonic() - self._last_change
+        return self._PAUSED_POLL if paused_for < self._LONG_PAUSE_AFTER else self._LONG_PAUSED_POLL
+
+    def close(self):
+        self._cover_pool.shutdown(cancel_futures=True)
+        if self._http is not None:
+            self._http.close()
+
     def _fetch_cover(self, album_info: dict) -> Optional[bytes]:
+        """Return the album's cover if it is already known; otherwise start
+        downloading it and return ``None`` until a later call."""
+        self._collect_cover()
         album_id = album_info.get("id", "")
         if album_id and album_id == self._last_album_id:
             return self._cached_cover
 
         self._last_album_id = album_id
-        self._cached_cover = None
+        cover = self._covers.get(album_id) if album_id else None
+        if cover is not None:
+            self._covers.move_to_end(album_id)
+        elif self._pending_cover is None or self._pending_cover[0] != album_id:
+            if self._pending_cover is not None:
+                self._pending_cover[1].cancel()
+            self._pending_cover = (
+                album_id, self._cover_pool.submit(self._download_cover, album_info)
+            )
+        self._cached_cover = cover
+        return cover
 
+    def _collect_cover(self):
+        """Move a finished download into the cache."""
+        pending = self._pending_cover
+        if pending is None or not pending[1].done():
+            return
+        self._pending_cover = None
+        album_id, fut = pending
+        try:
+            cover = fut.result()
+        except Exception as e:
+            log.debug("Spotify cover download: %s", e)
+            cover = None
+        if cover is not None and album_id:
+            self._covers[album_id] = cover
+            if len(self._covers) > self._COVER_CACHE_MAX:
+                self._covers.popitem(last=False)
+        if album_id == self._last_album_id:
+            self._cached_cover = cover
+
+    def _download_cover(self, album_info: dict) -> Optional[bytes]:
         images = album_info.get("images", [])
-        if images:
-            img_url = images[0].get("url", "")
-            if img_url:
-                try:
-                    with urllib.request.urlopen(img_url, timeout=5) as resp:
-                        self._cached_cover = resp.read()
-                except Exception as e:
-                    log.debug("Spotify cover fetch failed: %s", e)
-        return self._cached_cover
+        img_url = images[0].get("url", "") if images else ""
+        if not img_url:
+            return None
+        try:
+            if self._http is None:
+                self._http = self._make_session()
+            resp = self._http.get(img_url, timeout=5)
+            resp.raise_for_status()
+            return resp.content
+        except Exception as e:
+            log.debug("Spotify cover fetch failed: %s", e)
+            return None
 
     def search_and_play(self, track: str, artist: str = "",
                         position_ms: int = 0) -> bool:
@@ -136,9 +301,14 @@ class SpotifyProvider(BaseProvider):
             position_ms: Playback offset so the listener starts at the same
                          second as the host.
         """
+        self.last_error = None
         if self._sp is None:
             log.debug("search_and_play: Spotify client not initialised")
             return False
+        if self._rate_limited():
+            log.debug("search_and_play: skipped, Spotify rate limit window still open")
+            self.last_error = "rate_limited"
+            return False
         try:
             matched = self._search_track(track, artist)
             if matched is None:
@@ -151,11 +321,13 @@ class SpotifyProvider(BaseProvider):
                 playback_kw["position_ms"] = adjusted_ms
 
             try:
-                self._sp.start_playback(**playback_kw)
+                self._call(self._sp.start_playback, **playback_kw)
             except Exception as e:
                 code = getattr(e, "http_status", None)
                 reason = getattr(e, "msg", str(e))
-                if code == 404:
+                if code == 429:
+                    self.last_error = "rate_limited"
+                elif code == 404:
                     log.debug("search_and_play: HTTP 404 — no active device (%s)", reason)
                     self.last_error = "no_active_device"
                 elif code == 403:
@@ -179,7 +351,7 @@ class SpotifyProvider(BaseProvider):
             return True
         except Exception as e:
             log.warning("search_and_play failed: %s", e, exc_info=True)
-            self.last_error = str(e)
+            self.last_error = "rate_limited" if getattr(e, "http_status", None) == 429 else str(e)
             return False
 
     def _search_track(self, track: str, artist: str) -> Optional[dict]:
@@ -190,7 +362,7 @@ class SpotifyProvider(BaseProvider):
         structured = f"track:{track}"
         if artist:
             structured += f" artist:{artist}"
-        results = self._sp.search(q=structured, type="track", limit=5)
+        results = self._call(self._sp.search, q=structured, type="track", limit=5) or {}
         items = results.get("tracks", {}).get("items", [])
         if items:
             matched = self._fuzzy_pick(items, track, artist)
@@ -200,7 +372,7 @@ class SpotifyProvider(BaseProvider):
 
         plain = f"{norm_track} {norm_artist}".strip()
         log.debug("Falling back to plain search: %r", plain)
-        results = self._sp.search(q=plain, type="track", limit=10)
+        results = self._call(self._sp.search, q=plain, type="track", limit=10) or {}
         items = results.get("tracks", {}).get("items", [])
         if items:
             matched = self._fuzzy_pick(items, track, artist)
@@ -214,29 +386,16 @@ class SpotifyProvider(BaseProvider):
                     return top
         return None
 
-    _STRIP_SUFFIXES = re.compile(
-        r"\s*[\-–—]\s*(single|deluxe|remaster(ed)?(\s*\d{4})?|bonus\s*track|"
-        r"expanded|anniversary|live|remix|version|edition|"
-        r"explicit|clean|mono|stereo|radio\s*edit|acoustic|"
-        r"original\s*mix|extended|instrumental|interlude|skit)"
-        r".*$",
-        re.IGNORECASE,
-    )
-    _PAREN_NOISE = re.compile(
-        r"\s*[\(\[](?:remaster(ed)?(\s*\d{4})?|deluxe(\s*edition)?|"
-        r"single|bonus|expanded|anniversary(\s*edition)?|"
-        r"live|remix|feat\.?[^)\]]*|ft\.?[^)\]]*|with\s+[^)\]]*|"
-        r"version|edition|explicit|clean|mono|stereo|"
-        r"radio\s*edit|acoustic|original\s*mix|extended|"
-        r"instrumental|from\s+[^)\]]*|prod\.?\s*[^)\]]*)[^)\]]*[\)\]]",
-        re.IGNORECASE,
-    )
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _normalize(text: str) -> str:
+        """Strip common suffixes/parenthetical noise for fuzzy comparison.
 
-    @classmethod
-    def _normalize(cls, text: str) -> str:
-        """Strip common suffixes/parenthetical noise for fuzzy comparison."""
-        text = cls._PAREN_NOISE.sub("", text)
-        text = cls._STRIP_SUFFIXES.sub("", text)
+        Memoized: one search normalizes the query several times and the
+        same result names across the structured and plain searches.
+        """
+        text = _PAREN_NOISE.sub("", text)
+        text = _STRIP_SUFFIXES.sub("", text)
         return text.strip().lower()
 
     @classmethod
@@ -13,6 +13,7 @@ from tkinter import font as tkfont
 import webbrowser
 
 from logger import get_logger
+from utils import read_config_values
 
 log = get_logger("erp.setup_gui")
 
@@ -63,14 +64,8 @@ def _load_existing() -> dict:
         "SPOTIFY_CLIENT_SECRET": "",
         "SPOTIFY_REDIRECT_URI": "http://localhost:8888/callback",
     }
-    cfg_path = os.path.join(_app_dir(), "config.py")
-    if not os.path.isfile(cfg_path):
-        return defaults
-    ns: dict = {}
-    try:
-        with open(cfg_path, encoding="utf-8") as f:
-            exec(compile(f.read(), cfg_path, "exec"), ns)
-    except Exception:
+    ns = read_config_values(os.path.join(_app_dir(), "config.py"))
+    if ns is None:
         return defaults
     for key in defaults:
         val = ns.get(key, "")
@@ -108,17 +103,32 @@ def run_setup_gui() -> bool:
     btn_font = tkfont.Font(family="Segoe UI", size=11, weight="bold")
     small_font = tkfont.Font(family="Segoe UI", size=8)
 
-    header = tk.Frame(root, bg=_BG)
+    # Shared widget defaults go into the option database once instead of
+    # being repeated on every Frame/Label/Entry.
+    for pattern, value in (
+        ("*Frame.background", _BG),
+        ("*Label.background", _BG),
+        ("*Label.foreground", _FG),
+        ("*Label.anchor", "w"),
+        ("*Label.font", label_font),
+        ("*Entry.font", entry_font),
+        ("*Entry.background", _BG_FIELD),
+        ("*Entry.foreground", _FG),
+        ("*Entry.insertBackground", _FG),
+        ("*Entry.relief", "flat"),
+        ("*Entry.highlightThickness", 1),
+        ("*Entry.highlightColor", _ACCENT),
+        ("*Entry.highlightBackground", _ENTRY_BORDER),
+        ("*Button.relief", "flat"),
+        ("*Button.cursor", "hand2"),
+    ):
+        root.option_add(pattern, value)
+
+    header = tk.Frame(root)
     header.pack(fill="x", padx=30, pady=(24, 4))
 
-    tk.Label(
-        header, text="EternalRichPresence", font=title_font,
-        fg=_ACCENT, bg=_BG, anchor="w",
-    ).pack(anchor="w")
-    tk.Label(
-        header, text="by Ali Younes (@whoisaldo)", font=subtitle_font,
-        fg=_FG_DIM, bg=_BG, anchor="w",
-    ).pack(anchor="w")
+    tk.Label(header, text="EternalRichPresence", font=title_font, fg=_ACCENT).pack(anchor="w")
+    tk.Label(header, text="by Ali Younes (@whoisaldo)", font=subtitle_font, fg=_FG_DIM).pack(anchor="w")
 
     sep = tk.Frame(root, bg=_ACCENT, height=2)
     sep.pack(fill="x", padx=30, pady=(12, 16))
@@ -128,29 +138,17 @@ def run_setup_gui() -> bool:
     fields: dict[str, tk.Entry] = {}
 
     def _add_field(parent, label_text: str, key: str, show: str = ""):
-        frame = tk.Frame(parent, bg=_BG)
+        frame = tk.Frame(parent)
         frame.pack(fill="x", padx=30, pady=(0, 10))
-        tk.Label(
-            frame, text=label_text, font=label_font,
-            fg=_FG, bg=_BG, anchor="w",
-        ).pack(anchor="w")
-        entry = tk.Entry(
-            frame, font=entry_font, bg=_BG_FIELD, fg=_FG,
-            insertbackground=_FG, relief="flat",
-            highlightthickness=1, highlightcolor=_ACCENT,
-            highlightbackground=_ENTRY_BORDER,
-            show=show,
-        )
+        tk.Label(frame, text=label_text).pack(anchor="w")
+        entry = tk.Entry(frame, show=show)
         entry.pack(fill="x", ipady=6, pady=(2, 0))
         entry.insert(0, existing.get(key, ""))
         fields[key] = entry
 
     _add_field(root, "Discord Client ID *", "CLIENT_ID")
 
-    sp_label = tk.Label(
-        root, text="Spotify (optional — leave blank to disable)",
-        font=label_font, fg=_FG_DIM, bg=_BG, anchor="w",
-    )
+    sp_label = tk.Label(root, text="Spotify (optional — leave blank to disable)", fg=_FG_DIM)
     sp_label.pack(fill="x", padx=30, pady=(6, 4))
 
     _add_field(root, "Spotify Client ID", "SPOTIFY_CLIENT_ID")
@@ -158,10 +156,7 @@ def run_setup_gui() -> bool:
     _add_field(root, "Spotify Redirect URI", "SPOTIFY_REDIRECT_URI")
 
     status_var = tk.StringVar(value="")
-    status_label = tk.Label(
-        root, textvariable=status_var, font=small_font,
-        fg=_ACCENT, bg=_BG, anchor="w",
-    )
+    status_label = tk.Label(root, textvariable=status_var, font=small_font, fg=_ACCENT)
     status_label.pack(fill="x", padx=30, pady=(0, 4))
 
     def _on_save():
@@ -183,14 +178,13 @@ def run_setup_gui() -> bool:
             status_var.set(f"Save failed: {e}")
             log.error("Setup GUI save failed: %s", e)
 
-    btn_frame = tk.Frame(root, bg=_BG)
+    btn_frame = tk.Frame(root)
     btn_frame.pack(fill="x", padx=30, pady=(8, 0))
 
     save_btn = tk.Button(
         btn_frame, text="Save & Launch", font=btn_font,
         bg=_BTN_BG, fg=_BTN_FG, activebackground=_BTN_HOVER,
-        activeforeground=_BTN_FG, relief="flat", cursor="hand2",
-        command=_on_save, padx=16, pady=6,
+        activeforeground=_BTN_FG, command=_on_save, padx=16, pady=6,
     )
     save_btn.pack(side="left")
 
@@ -200,15 +194,14 @@ def run_setup_gui() -> bool:
     help_btn = tk.Button(
         btn_frame, text="Help / Setup Guide", font=label_font,
         bg=_BG_FIELD, fg=_FG_DIM, activebackground=_ENTRY_BORDER,
-        activeforeground=_FG, relief="flat", cursor="hand2",
-        command=_on_help, padx=12, pady=6,
+        activeforeground=_FG, command=_on_help, padx=12, pady=6,
     )
     help_btn.pack(side="right")
 
     footer = tk.Label(
         root,
         text="github.com/whoisaldo/Eternal-Rich-Presence",
-        font=small_font, fg=_FG_DIM, bg=_BG, cursor="hand2",
+        font=small_font, fg=_FG_DIM, cursor="hand2", anchor="center",
     )
     footer.pack(side="bottom", pady=(0, 12))
     footer.bind("<Button-1>", lambda _e: webbrowser.open(_REPO_URL))
@@ -1,13 +1,28 @@
+import ast
+import functools
+import http.client
+import io
 import os
+import queue
+import random
+import re
 import sys
-import urllib.request
-from typing import Optional
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple, Union
 
 from logger import get_logger
 
+try:
+    import winreg
+except ImportError:
+    winreg = None
+
 log = get_logger("erp.utils")
 
 
+@functools.lru_cache(maxsize=None)
 def app_dir() -> str:
     """Absolute path to the application directory (handles PyInstaller frozen builds)."""
     if getattr(sys, "frozen", False):
@@ -15,55 +30,338 @@ def app_dir() -> str:
     return os.path.dirname(os.path.abspath(__file__))
 
 
-def upload_cover_to_catbox(thumbnail_bytes: bytes) -> Optional[str]:
-    """Upload image bytes to catbox.moe (anonymous). Returns the public URL or None."""
-    if not thumbnail_bytes or len(thumbnail_bytes) > 20 * 1024 * 1024:
+def bind_winapi(dll, name: str, restype, *argtypes):
+    """Fetch a Win32 export with its signature declared once, up front.
+
+    Declared argtypes let ctypes marshal straight to the C types instead of
+    guessing per call, and keep 64-bit HANDLEs from being truncated to int.
+    """
+    fn = getattr(dll, name)
+    fn.restype = restype
+    fn.argtypes = list(argtypes)
+    return fn
+
+
+class DaemonExecutor:
+    """Small ``ThreadPoolExecutor`` stand-in whose workers are daemon threads.
+
+    ``concurrent.futures`` joins its workers at interpreter exit, so a cover
+    upload or API call still in flight would hold up quitting from the tray.
+    These workers are simply abandoned when the process exits.
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str):
+        self._max_workers = max_workers
+        self._prefix = thread_name_prefix
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._threads: List[threading.Thread] = []
+        self._idle = threading.Semaphore(0)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        fut: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            self._queue.put((fut, fn, args, kwargs))
+            # Same rule as ThreadPoolExecutor: reuse an idle worker, else add one.
+            if not self._idle.acquire(blocking=False) and len(self._threads) < self._max_workers:
+                t = threading.Thread(
+                    target=self._work, name=f"{self._prefix}_{len(self._threads)}", daemon=True
+                )
+                self._threads.append(t)
+                t.start()
+        return fut
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            fut, fn, args, kwargs = item
+            del item
+            if fut.set_running_or_notify_cancel():
+                try:
+                    fut.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    fut.set_exception(e)
+            del fut
+            self._idle.release()
+
+    def shutdown(self, wait: bool = False, cancel_futures: bool = False):
+        with self._lock:
+            self._closed = True
+            if cancel_futures:
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        item[0].cancel()
+            for _ in self._threads:
+                self._queue.put(None)
+        if wait:
+            for t in self._threads:
+                t.join()
+
+
+def read_config_values(path: str) -> Optional[dict]:
+    """Return the literal top-level ``NAME = value`` assignments in ``path``.
+
+    The file is parsed, never executed, so re-reading it after the setup GUI
+    rewrites it has no import side effects.  Non-literal values are skipped.
+    Returns ``None`` if the file is missing or isn't valid Python.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+    except (OSError, SyntaxError, ValueError) as e:
+        log.debug("read_config_values(%s): %s", path, e)
         return None
-    boundary = b"----EternalRP" + os.urandom(8).hex().encode()
-    body = (
-        b"--" + boundary + b"\r\n"
-        b'Content-Disposition: form-data; name="reqtype"\r\n\r\n'
-        b"fileupload\r\n"
-        b"--" + boundary + b"\r\n"
-        b'Content-Disposition: form-data; name="fileToUpload"; filename="cover.jpg"\r\n'
-        b"Content-Type: image/jpeg\r\n\r\n"
-        + thumbnail_bytes + b"\r\n"
-        b"--" + boundary + b"--\r\n"
-    )
+    values = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets = [node.target]
+        else:
+            continue
+        try:
+            value = ast.literal_eval(node.value)
+        except Exception as e:
+            log.debug("read_config_values: skipping non-literal at line %d: %s", node.lineno, e)
+            continue
+        for target in targets:
+            if isinstance(target, ast.Name):
+                values[target.id] = value
+    return values
+
+
+# RFC 3986 unreserved characters pass through; every other UTF-8 byte is
+# percent-escaped.  Same output as urllib.parse.quote(text, safe="").
+_UNRESERVED = frozenset(
+    b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_.~"
+)
+_QUOTE_TABLE = tuple(
+    chr(b) if b in _UNRESERVED else "%%%02X" % b for b in range(256)
+)
+
+
+def quote_component(text: str) -> str:
+    """Percent-encode ``text`` for use as a single URI query value."""
+    if text.isascii() and text.isalnum():
+        return text
+    table = _QUOTE_TABLE
+    return "".join([table[b] for b in text.encode("utf-8")])
+
+
+_CATBOX_HOST = "catbox.moe"
+_CATBOX_PATH = "/user/api.php"
+_CATBOX_TIMEOUT = 10
+# Uploads that fail on the network or with one of these statuses are tried
+# again, up to _CATBOX_ATTEMPTS in all, after 0.25 s, 0.5 s, ... plus jitter.
+_CATBOX_ATTEMPTS = 3
+_CATBOX_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+_CATBOX_BACKOFF = 0.25
+# A successful upload answers with just the file's URL.
+_CATBOX_URL = re.compile(rb"https?://[!-~]*catbox\.moe[!-~]*")
+_CATBOX_URL_MAX = 500
+
+# One keep-alive connection shared by every upload so the TLS handshake is
+# paid once, not per cover change.  http.client connections are not
+# thread-safe, hence the lock.
+_catbox_conn: Optional[http.client.HTTPSConnection] = None
+_catbox_lock = threading.Lock()
+
+
+def preconnect_catbox():
+    """Open the catbox connection ahead of the first upload, if none is open yet.
+
+    Takes the TCP and TLS handshakes off the first cover change.  Blocks
+    for the handshake, so call it from a worker thread.
+    """
+    global _catbox_conn
+    with _catbox_lock:
+        if _catbox_conn is not None:
+            return
+        conn = http.client.HTTPSConnection(_CATBOX_HOST, timeout=_CATBOX_TIMEOUT)
+        try:
+            conn.connect()
+        except Exception as e:
+            conn.close()
+            log.debug("Catbox preconnect failed: %s", e)
+            return
+        _catbox_conn = conn
+
+
+def _catbox_post(parts: tuple, content_type: str) -> Tuple[int, bytes]:
+    """POST ``parts`` (sent back to back, never joined); returns (status, body)."""
+    global _catbox_conn
+    headers = {
+        "Content-Type": content_type,
+        "Content-Length": str(sum(len(p) for p in parts)),
+        "User-Agent": "EternalRichPresence",
+    }
+    with _catbox_lock:
+        # catbox drops idle keep-alive sockets; a reused connection that
+        # fails before any response gets one retry on a fresh one.
+        for attempt in range(2):
+            reused = _catbox_conn is not None
+            if not reused:
+                _catbox_conn = http.client.HTTPSConnection(_CATBOX_HOST, timeout=_CATBOX_TIMEOUT)
+            conn = _catbox_conn
+            try:
+                conn.request("POST", _CATBOX_PATH, body=parts, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (http.client.RemoteDisconnected, ConnectionError) as e:
+                conn.close()
+                _catbox_conn = None
+                if not reused or attempt:
+                    raise
+                log.debug("Catbox keep-alive connection went stale, reconnecting: %s", e)
+                continue
+            except Exception:
+                conn.close()
+                _catbox_conn = None
+                raise
+            break
+        if resp.will_close:
+            conn.close()
+            _catbox_conn = None
+    return resp.status, data
+
+
+# The boundary only has to be unlikely to occur in the image, so one random
+# value per process will do, and the form around the image is fixed.
+_BOUNDARY = b"----EternalRP" + os.urandom(16).hex().encode()
+_UPLOAD_HEAD = (
+    b"--" + _BOUNDARY + b"\r\n"
+    b'Content-Disposition: form-data; name="reqtype"\r\n\r\n'
+    b"fileupload\r\n"
+    b"--" + _BOUNDARY + b"\r\n"
+    b'Content-Disposition: form-data; name="fileToUpload"; filename="cover.jpg"\r\n'
+    b"Content-Type: image/jpeg\r\n\r\n"
+)
+_UPLOAD_TAIL = b"\r\n--" + _BOUNDARY + b"--\r\n"
+_UPLOAD_CONTENT_TYPE = "multipart/form-data; boundary=" + _BOUNDARY.decode()
+
+_COVER_MAX_PX = 256
+_COVER_JPEG_QUALITY = 80
+
+
+def downscale_cover(image_bytes: bytes) -> bytes:
+    """Shrink cover art to at most 256x256 JPEG; returns the input unchanged on failure.
+
+    Discord only ever shows the large image at a small size, so there's no
+    point uploading a multi-megabyte original.
+    """
     try:
-        req = urllib.request.Request(
-            "https://catbox.moe/user/api.php",
-            data=body,
-            method="POST",
-        )
-        req.add_header("Content-Type", "multipart/form-data; boundary=" + boundary.decode())
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            url = resp.read().decode().strip()
-            if url and "catbox.moe" in url and url.startswith("http") and len(url) < 500:
-                return url
+        from PIL import Image
+        with Image.open(io.BytesIO(image_bytes)) as im:
+            if im.format == "JPEG" and max(im.size) <= _COVER_MAX_PX:
+                return image_bytes
+            im.thumbnail((_COVER_MAX_PX, _COVER_MAX_PX))
+            if im.mode != "RGB":
+                im = im.convert("RGB")
+            out = io.BytesIO()
+            im.save(out, "JPEG", quality=_COVER_JPEG_QUALITY, optimize=True)
+        return out.getvalue()
     except Exception as e:
-        log.debug("Cover upload to catbox failed: %s", e)
+        log.debug("Cover downscale failed, using original: %s", e)
+        return image_bytes
+
+
+def upload_cover_to_catbox(thumbnail_bytes: Union[bytes, bytearray, memoryview]) -> Optional[str]:
+    """Upload image bytes to catbox.moe (anonymous). Returns the public URL or None.
+
+    Any contiguous buffer is accepted; it is sent as-is, never copied.
+    """
+    image = memoryview(thumbnail_bytes).cast("B")
+    if not image.nbytes or image.nbytes > 20 * 1024 * 1024:
+        return None
+    for attempt in range(_CATBOX_ATTEMPTS):
+        if attempt:
+            time.sleep(_CATBOX_BACKOFF * 2 ** (attempt - 1) * random.uniform(1, 1.5))
+        try:
+            status, raw = _catbox_post((_UPLOAD_HEAD, image, _UPLOAD_TAIL), _UPLOAD_CONTENT_TYPE)
+        except (OSError, http.client.HTTPException) as e:
+            log.debug("Cover upload to catbox failed (attempt %d): %s", attempt + 1, e)
+            continue
+        except Exception as e:
+            log.debug("Cover upload to catbox failed: %s", e)
+            return None
+        if status == 200:
+            raw = raw.strip()
+            if len(raw) < _CATBOX_URL_MAX and _CATBOX_URL.fullmatch(raw):
+                return raw.decode("ascii")
+            return None
+        log.debug("Catbox returned HTTP %d (attempt %d)", status, attempt + 1)
+        if status not in _CATBOX_RETRY_STATUSES:
+            return None
     return None
 
 
+def _registry_matches(root: int, keys) -> bool:
+    """True if every value in ``keys`` is already present with the same data."""
+    try:
+        for subkey, values in keys:
+            with winreg.OpenKey(root, subkey, 0, winreg.KEY_READ) as k:
+                for name, value in values:
+                    if winreg.QueryValueEx(k, name)[0] != value:
+                        return False
+    except OSError:
+        return False
+    return True
+
+
+def _write_registry(root: int, keys):
+    """Create each ``(subkey, ((name, value), ...))`` under ``root`` as REG_SZ values.
+
+    Nothing is written if the values are already in place, which also lets
+    an unelevated start succeed once an admin run has registered HKCR.
+    Raises ``OSError`` on failure.
+    """
+    if _registry_matches(root, keys):
+        return
+    for subkey, values in keys:
+        with winreg.CreateKey(root, subkey) as k:
+            for name, value in values:
+                winreg.SetValueEx(k, name, 0, winreg.REG_SZ, value)
+
+
+@functools.lru_cache(maxsize=8)
+def _exe_command(exe_path: Optional[str]) -> Optional[str]:
+    """Registry ``shell\\open\\command`` value that launches ``exe_path`` with the URL.
+
+    ``None`` if the executable doesn't exist, so no handler is registered
+    that can never start.
+    """
+    path = os.path.abspath(exe_path or sys.executable)
+    if not os.path.isfile(path):
+        log.warning("Not registering protocol handler: %s does not exist", path)
+        return None
+    return f'"{path}" "%1"'
+
+
 def register_uri_scheme(exe_path: str = None, silent: bool = False) -> bool:
     """Register the eternalrp:// protocol handler in the Windows Registry (requires admin)."""
-    try:
-        import winreg
-    except ImportError:
+    if winreg is None:
         if not silent:
             print("Registry access requires Windows.", file=sys.stderr)
         return False
 
-    cmd = os.path.abspath(exe_path or sys.executable)
-    command = f'"{cmd}" "%1"'
+    command = _exe_command(exe_path)
+    if command is None:
+        return False
 
     try:
-        with winreg.CreateKey(winreg.HKEY_CLASSES_ROOT, "eternalrp") as k:
-            winreg.SetValueEx(k, None, 0, winreg.REG_SZ, "URL:Eternal Rich Presence")
-            winreg.SetValueEx(k, "URL Protocol", 0, winreg.REG_SZ, "")
-        with winreg.CreateKey(winreg.HKEY_CLASSES_ROOT, r"eternalrp\shell\open\command") as k:
-            winreg.SetValueEx(k, None, 0, winreg.REG_SZ, command)
+        _write_registry(winreg.HKEY_CLASSES_ROOT, (
+            ("eternalrp", ((None, "URL:Eternal Rich Presence"), ("URL Protocol", ""))),
+            (r"eternalrp\shell\open\command", ((None, command),)),
+        ))
         return True
     except OSError as e:
         log.warning("URI registration failed: %s (run as Administrator)", e)
@@ -81,23 +379,22 @@ def register_discord_launch(client_id: str, exe_path: str = None, silent: bool =
 
     Written to HKCU (no admin required).
     """
-    try:
-        import winreg
-    except ImportError:
+    if winreg is None:
+        if not silent:
+            print("Registry access requires Windows.", file=sys.stderr)
         return False
 
-    cmd = os.path.abspath(exe_path or sys.executable)
-    command = f'"{cmd}" "%1"'
+    command = _exe_command(exe_path)
+    if command is None:
+        return False
     protocol = f"discord-{client_id}"
 
     try:
-        with winreg.CreateKey(winreg.HKEY_CURRENT_USER, rf"SOFTWARE\Classes\{protocol}") as k:
-            winreg.SetValueEx(k, None, 0, winreg.REG_SZ, f"URL:Run EternalRichPresence")
-            winreg.SetValueEx(k, "URL Protocol", 0, winreg.REG_SZ, "")
-        with winreg.CreateKey(
-            winreg.HKEY_CURRENT_USER, rf"SOFTWARE\Classes\{protocol}\shell\open\command"
-        ) as k:
-            winreg.SetValueEx(k, None, 0, winreg.REG_SZ, command)
+        _write_registry(winreg.HKEY_CURRENT_USER, (
+            (rf"SOFTWARE\Classes\{protocol}",
+             ((None, "URL:Run EternalRichPresence"), ("URL Protocol", ""))),
+            (rf"SOFTWARE\Classes\{protocol}\shell\open\command", ((None, command),)),
+        ))
         return True
     except OSError as e:
         log.warning("Discord protocol registration failed: %s", e)